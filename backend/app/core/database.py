@@ -5,9 +5,10 @@
 
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from sqlalchemy import DateTime, func
+from sqlalchemy import DateTime, func, text
 from typing import AsyncGenerator
 import logging
+import time
 
 from .config import settings
 
@@ -28,8 +29,28 @@ if not settings.DATABASE_URL.startswith("sqlite"):
         "max_overflow": 20
     })
 
+# 进程级共享引擎：应用内所有会话都应通过它（或AsyncSessionLocal）获取连接，不要按请求创建新引擎
 engine = create_async_engine(settings.DATABASE_URL, **engine_kwargs)
 
+# 健康检查专用的小连接池引擎，避免高频探测占用业务连接池
+health_engine_kwargs = {
+    "echo": settings.DATABASE_ECHO,
+}
+
+if not settings.DATABASE_URL.startswith("sqlite"):
+    health_engine_kwargs.update({
+        "pool_pre_ping": True,
+        "pool_recycle": 300,
+        "pool_size": 2,
+        "max_overflow": 0
+    })
+
+health_engine = create_async_engine(settings.DATABASE_URL, **health_engine_kwargs)
+
+# 数据库健康检查结果缓存时间（秒）
+DB_HEALTH_CACHE_TTL = 5.0
+_db_health_cache = {"checked_at": 0.0, "ok": False}
+
 # 创建异步会话工厂
 AsyncSessionLocal = async_sessionmaker(
     engine,
@@ -82,7 +103,31 @@ async def init_db() -> None:
         logger.info("数据库表创建完成")
 
 
+async def check_db_health() -> bool:
+    """
+    检查数据库是否可用
+    使用健康检查专用引擎执行 SELECT 1，结果缓存 DB_HEALTH_CACHE_TTL 秒，
+    以免频繁的健康探测直接打到数据库
+    """
+    now = time.monotonic()
+    if _db_health_cache["checked_at"] and now - _db_health_cache["checked_at"] < DB_HEALTH_CACHE_TTL:
+        return _db_health_cache["ok"]
+    
+    try:
+        async with health_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        ok = True
+    except Exception as e:
+        logger.error(f"数据库健康检查失败: {e}")
+        ok = False
+    
+    _db_health_cache["checked_at"] = time.monotonic()
+    _db_health_cache["ok"] = ok
+    return ok
+
+
 async def close_db() -> None:
     """关闭数据库连接"""
     await engine.dispose()
+    await health_engine.dispose()
     logger.info("数据库连接已关闭")
\ No newline at end of file
@@ -11,11 +11,14 @@ import logging
 import hashlib
 import os
 import json
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.header import decode_header
 from typing import List, Optional, Dict, Any, Tuple
+from sqlalchemy import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
@@ -27,6 +30,10 @@ from app.utils.tracker_utils import generate_tracker_id
 
 logger = logging.getLogger(__name__)
 
+# IMAP连接保活间隔（秒）：在此时间内有过成功交互的连接直接复用，不再额外发送NOOP
+# 取值低于RFC 3501规定的服务器最短空闲超时（30分钟）
+IMAP_KEEPALIVE_INTERVAL = 25 * 60
+
 
 class EmailService:
     """邮件服务类"""
@@ -34,6 +41,12 @@ class EmailService:
     def __init__(self):
         self.imap_connection = None
         self.smtp_connection = None
+        # smtplib连接不支持并发使用：共享连接上的发送需串行化
+        self.smtp_lock = asyncio.Lock()
+        # 最近一次与IMAP服务器成功交互的时间（time.monotonic）
+        self._imap_last_activity = 0.0
+        # 当前连接已选中的邮箱，避免每轮检查重复SELECT
+        self._imap_selected_mailbox = None
     
     async def connect_imap(self) -> bool:
         """连接到IMAP服务器"""
@@ -50,6 +63,8 @@ class EmailService:
             
             # 登录
             self.imap_connection.login(settings.IMAP_USER, settings.IMAP_PASSWORD)
+            self._imap_last_activity = time.monotonic()
+            self._imap_selected_mailbox = None
             logger.info("IMAP连接成功")
             return True
             
@@ -58,12 +73,17 @@ class EmailService:
             return False
 
     async def check_imap_connection(self) -> bool:
-        """检查并维护IMAP连接"""
+        """检查并维护IMAP连接（复用持久连接，仅在长时间无交互时发送NOOP保活）"""
         if self.imap_connection:
+            # 近期有过成功交互的连接直接复用；若已失效，后续命令出错时会断开并在下一轮重连
+            if time.monotonic() - self._imap_last_activity < IMAP_KEEPALIVE_INTERVAL:
+                return True
+            
             try:
                 # 使用NOOP检查连接是否仍然有效
                 status, _ = self.imap_connection.noop()
                 if status == 'OK':
+                    self._imap_last_activity = time.monotonic()
                     return True
             except (imaplib.IMAP4.abort, imaplib.IMAP4.error, ConnectionResetError) as e:
                 logger.warning(f"IMAP连接已失效: {e}，正在尝试重新连接...")
@@ -79,10 +99,14 @@ class EmailService:
             if self.imap_connection:
                 self.imap_connection.close()
                 self.imap_connection.logout()
-                self.imap_connection = None
                 logger.info("IMAP连接已断开")
         except Exception as e:
             logger.error(f"断开IMAP连接时出错: {e}")
+        finally:
+            # 无论是否正常断开，都丢弃旧连接，确保下一轮检查重新建立连接
+            self.imap_connection = None
+            self._imap_selected_mailbox = None
+            self._imap_last_activity = 0.0
     
 
 
@@ -130,6 +154,23 @@ class EmailService:
         except Exception as e:
             logger.error(f"断开SMTP连接时出错: {e}")
     
+    @asynccontextmanager
+    async def smtp_session(self):
+        """
+        在SMTP连接上执行发送的上下文，产出连接是否可用
+        已有连接时直接复用且退出时不断开（连接归建立者管理），否则临时建立并在退出时断开
+        """
+        if self.smtp_connection is not None:
+            yield True
+            return
+        
+        connected = await self.connect_smtp()
+        try:
+            yield connected
+        finally:
+            if connected:
+                await self.disconnect_smtp()
+    
     def _hash_email(self, email_address: str) -> str:
         """对邮箱地址进行哈希处理"""
         return hashlib.sha256(email_address.lower().encode()).hexdigest()
@@ -272,12 +313,17 @@ class EmailService:
             logger.error(f"验证附件失败: {e}")
             return False, "验证失败"
     
+    async def send_message(self, msg: MIMEMultipart):
+        """
+        通过当前SMTP连接发送邮件
+        smtplib为阻塞实现，发送在线程中执行，并由smtp_lock保证同一连接上不会并发写入
+        """
+        async with self.smtp_lock:
+            await asyncio.to_thread(self.smtp_connection.send_message, msg)
+    
     async def send_limit_notification(self, to_email: str, limit_type: str):
         """发送限制通知邮件"""
         try:
-            if not await self.connect_smtp():
-                return False
-            
             subject = "邮件发送频率限制通知"
             body = f"""
             您好，
@@ -299,10 +345,12 @@ class EmailService:
             
             msg.attach(MIMEText(body, 'plain', 'utf-8'))
             
-            self.smtp_connection.send_message(msg)
+            async with self.smtp_session() as connected:
+                if not connected:
+                    return False
+                await self.send_message(msg)
             logger.info(f"限制通知邮件已发送至: {to_email}")
             
-            await self.disconnect_smtp()
             return True
             
         except Exception as e:
@@ -316,8 +364,10 @@ class EmailService:
             if not await self.check_imap_connection():
                 return []
             
-            # 选择邮箱
-            self.imap_connection.select(settings.IMAP_MAILBOX)
+            # 选择邮箱（同一连接只需选择一次）
+            if self._imap_selected_mailbox != settings.IMAP_MAILBOX:
+                self.imap_connection.select(settings.IMAP_MAILBOX)
+                self._imap_selected_mailbox = settings.IMAP_MAILBOX
             
             # 搜索未读邮件
             status, messages = self.imap_connection.search(None, 'UNSEEN')
@@ -326,6 +376,8 @@ class EmailService:
                 logger.error("搜索邮件失败")
                 return []
             
+            self._imap_last_activity = time.monotonic()
+            
             email_ids = messages[0].split()
             processed_emails = []
             
@@ -464,6 +516,8 @@ class EmailService:
         """保存邮件记录到数据库"""
         try:
             saved_records = []  # 用于存储成功保存的记录，以便发送确认邮件
+            email_upload_rows = []
+            article_rows = []
             
             for record in email_records:
                 for attachment in record['attachments']:
@@ -471,43 +525,39 @@ class EmailService:
                     tracker_id = generate_tracker_id("EMAIL")
                     
                     # 保存到email_upload表
-                    email_upload = EmailUpload(
-                        sender_email_hash=record['sender_email_hash'],
-                        sender_email=record['sender_email'],  # 存储原始邮箱
-                        original_filename=attachment['original_filename'],
-                        stored_filename=attachment['stored_filename'],
-                        file_size=attachment['file_size'],
-                        file_type=attachment['file_type'],
-                        email_subject=record['subject'],
-                        status=EmailUploadStatus.PENDING,
-                        received_at=record['received_at']
-                    )
-                    
-                    db.add(email_upload)
+                    email_upload_rows.append({
+                        'sender_email_hash': record['sender_email_hash'],
+                        'sender_email': record['sender_email'],  # 存储原始邮箱
+                        'original_filename': attachment['original_filename'],
+                        'stored_filename': attachment['stored_filename'],
+                        'file_size': attachment['file_size'],
+                        'file_type': attachment['file_type'],
+                        'email_subject': record['subject'],
+                        'status': EmailUploadStatus.PENDING,
+                        'received_at': record['received_at']
+                    })
                     
                     # 同时保存到articles表以支持跟踪
-                    article = Article(
-                        title=record['subject'] or f"邮件附件: {attachment['original_filename']}",
-                        description=f"通过邮件上传的附件: {attachment['original_filename']}",
-                        github_url=f"email://{attachment['stored_filename']}",  # 唯一URL
-                        github_owner="email_upload",
-                        github_repo="attachments",
-                        file_type=self._get_file_type_enum(attachment['file_type']),
-                        file_size=attachment['file_size'],
-                        user_id=record['sender_email'],  # 使用发送者邮箱作为用户标识
-                        method=UploadMethod.EMAIL_UPLOAD,
-                        tracker_id=tracker_id,
-                        processing_status=ProcessingStatus.PENDING,
-                        extra_metadata={
+                    article_rows.append({
+                        'title': record['subject'] or f"邮件附件: {attachment['original_filename']}",
+                        'description': f"通过邮件上传的附件: {attachment['original_filename']}",
+                        'github_url': f"email://{attachment['stored_filename']}",  # 唯一URL
+                        'github_owner': "email_upload",
+                        'github_repo': "attachments",
+                        'file_type': self._get_file_type_enum(attachment['file_type']),
+                        'file_size': attachment['file_size'],
+                        'user_id': record['sender_email'],  # 使用发送者邮箱作为用户标识
+                        'method': UploadMethod.EMAIL_UPLOAD,
+                        'tracker_id': tracker_id,
+                        'processing_status': ProcessingStatus.PENDING,
+                        'extra_metadata': {
                             "email_upload_id": None,  # 将在提交后更新
                             "sender_email": record['sender_email'],
                             "email_subject": record['subject'],
                             "original_filename": attachment['original_filename'],
                             "stored_filename": attachment['stored_filename']
                         }
-                    )
-                    
-                    db.add(article)
+                    })
                     
                     # 记录成功保存的信息，用于发送确认邮件
                     saved_records.append({
@@ -517,6 +567,11 @@ class EmailService:
                         'file_size': attachment['file_size']
                     })
             
+            # 每张表一条批量INSERT，而不是逐个对象flush
+            if email_upload_rows:
+                await db.execute(insert(EmailUpload), email_upload_rows)
+                await db.execute(insert(Article), article_rows)
+            
             await db.commit()
             
             # 更新articles表中的email_upload_id引用
@@ -576,49 +631,42 @@ class EmailService:
             # 创建tracker服务实例
             tracker_service = TrackerService(db)
             
-            # 批量发送邮件时，只连接一次SMTP
-            if not await self.connect_smtp():
-                logger.error("无法连接SMTP服务器，跳过发送确认邮件")
-                return
-
-            success_count = 0
-            # 为每个成功保存的记录发送确认邮件
-            for record in saved_records:
-                try:
-                    logger.info(f"正在发送确认邮件: {record['tracker_id']} -> {record['sender_email']}")
-                    
-                    success = await tracker_service.send_tracker_confirmation_email(
-                        tracker_id=record['tracker_id'],
-                        recipient_email=record['sender_email'],
-                        filename=record['filename'],
-                        file_size=record['file_size'],
-                        use_existing_connection=True  # 告知tracker_service使用现有连接
-                    )
-                    
-                    if success:
-                        success_count += 1
-                        logger.info(f"确认邮件发送成功: {record['tracker_id']} -> {record['sender_email']}")
-                    else:
-                        logger.warning(f"确认邮件发送失败: {record['tracker_id']} -> {record['sender_email']}")
+            # 批量发送邮件时，只连接一次SMTP（已有连接时直接复用，且不在此断开）
+            async with self.smtp_session() as connected:
+                if not connected:
+                    logger.error("无法连接SMTP服务器，跳过发送确认邮件")
+                    return
+                
+                success_count = 0
+                # 为每个成功保存的记录发送确认邮件
+                for record in saved_records:
+                    try:
+                        logger.info(f"正在发送确认邮件: {record['tracker_id']} -> {record['sender_email']}")
                         
-                except Exception as e:
-                    logger.error(f"发送确认邮件异常 {record['tracker_id']}: {e}")
-                    # 继续处理其他邮件，不因单个邮件失败而中断
-                    continue
-            
-            # 断开SMTP连接
-            await self.disconnect_smtp()
+                        success = await tracker_service.send_tracker_confirmation_email(
+                            tracker_id=record['tracker_id'],
+                            recipient_email=record['sender_email'],
+                            filename=record['filename'],
+                            file_size=record['file_size'],
+                            use_existing_connection=True  # 告知tracker_service使用现有连接
+                        )
+                        
+                        if success:
+                            success_count += 1
+                            logger.info(f"确认邮件发送成功: {record['tracker_id']} -> {record['sender_email']}")
+                        else:
+                            logger.warning(f"确认邮件发送失败: {record['tracker_id']} -> {record['sender_email']}")
+                            
+                    except Exception as e:
+                        logger.error(f"发送确认邮件异常 {record['tracker_id']}: {e}")
+                        # 继续处理其他邮件，不因单个邮件失败而中断
+                        continue
 
             logger.info(f"完成发送确认邮件: {success_count}/{len(saved_records)} 成功")
             
         except Exception as e:
             logger.error(f"批量发送确认邮件失败: {e}")
-            # 邮件发送失败不应该影响数据保存，所以这里只记录错误
-            # 确保在异常时也断开连接
-            try:
-                await self.disconnect_smtp()
-            except Exception as disconnect_error:
-                logger.error(f"断开SMTP连接失败: {disconnect_error}")
+            # 邮件发送失败不应该影响数据保存，所以这里只记录错误（连接已由smtp_session断开）
 
 
 # 创建全局邮件服务实例
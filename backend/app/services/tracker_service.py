@@ -298,7 +298,8 @@ class TrackerService:
         recipient_email: str, 
         filename: str,
         status: str,
-        error_message: Optional[str] = None
+        error_message: Optional[str] = None,
+        use_existing_connection: bool = False
     ) -> bool:
         """
         发送状态更新邮件
@@ -309,6 +310,7 @@ class TrackerService:
             filename: 文件名
             status: 处理状态
             error_message: 错误信息（可选）
+            use_existing_connection: 是否使用现有SMTP连接
             
         Returns:
             bool: 发送是否成功
@@ -328,7 +330,8 @@ class TrackerService:
                 to_email=recipient_email,
                 subject=email_content['subject'],
                 html_body=email_content['html_body'],
-                text_body=email_content['text_body']
+                text_body=email_content['text_body'],
+                use_existing_connection=use_existing_connection
             )
             
             if success:
@@ -369,12 +372,6 @@ class TrackerService:
             from email.mime.text import MIMEText
             from app.core.config import settings
             
-            # 如果不使用现有连接，则连接SMTP服务器
-            if not use_existing_connection:
-                if not await email_service.connect_smtp():
-                    logger.error("无法连接SMTP服务器")
-                    return False
-            
             # 创建邮件消息
             msg = MIMEMultipart('alternative')
             msg['From'] = settings.SMTP_USER
@@ -388,21 +385,19 @@ class TrackerService:
             msg.attach(text_part)
             msg.attach(html_part)
             
-            # 发送邮件
-            await asyncio.to_thread(email_service.smtp_connection.send_message, msg)
-            
-            # 如果不使用现有连接，则断开连接
-            if not use_existing_connection:
-                await email_service.disconnect_smtp()
+            # 发送邮件（共享连接上的并发发送在此排队，模板渲染和消息构建仍可并行）
+            if use_existing_connection:
+                await email_service.send_message(msg)
+            else:
+                # 没有可用连接时临时建立并在发送后断开；已有连接则直接复用，不会被断开
+                async with email_service.smtp_session() as connected:
+                    if not connected:
+                        logger.error("无法连接SMTP服务器")
+                        return False
+                    await email_service.send_message(msg)
             
             return True
             
         except Exception as e:
             logger.error(f"发送邮件失败: {e}")
-            # 如果不使用现有连接，则尝试断开
-            if not use_existing_connection:
-                try:
-                    await email_service.disconnect_smtp()
-                except:
-                    pass
             return False
@@ -25,6 +25,10 @@ class EmailTaskManager:
         self.running = False
         self.check_task = None
         self.maintenance_task = None
+        # 停止信号：唤醒等待中的检查/维护循环，使其立即退出
+        self._stop_event = asyncio.Event()
+        # 停止完成信号：邮件检查循环退出（含当前一轮检查结束）后置位
+        self._stopped = asyncio.Event()
         self.stats = {
             "total_emails_processed": 0,
             "total_attachments_saved": 0,
@@ -45,6 +49,8 @@ class EmailTaskManager:
             return
         
         self.running = True
+        self._stop_event.clear()
+        self._stopped.clear()
         self.check_task = asyncio.create_task(self._email_check_loop())
         self.maintenance_task = asyncio.create_task(self._maintenance_loop())
         logger.info("邮件检查任务已启动")
@@ -55,27 +61,40 @@ class EmailTaskManager:
             return
         
         self.running = False
+        self._stop_event.set()
         
-        # 停止邮件检查任务
+        # 等待邮件检查循环完成当前一轮检查并退出
         if self.check_task:
-            self.check_task.cancel()
-            try:
-                await self.check_task
-            except asyncio.CancelledError:
-                pass
+            await self._stopped.wait()
         
-        # 停止维护任务
+        # 等待维护任务退出
         if self.maintenance_task:
-            self.maintenance_task.cancel()
-            try:
-                await self.maintenance_task
-            except asyncio.CancelledError:
-                pass
+            await self.maintenance_task
         
         logger.info("邮件检查任务已停止")
     
+    async def _wait_for_stop(self, timeout: float) -> bool:
+        """
+        等待停止信号，最长等待timeout秒
+        
+        Returns:
+            bool: 是否收到停止信号
+        """
+        try:
+            await asyncio.wait_for(self._stop_event.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+    
     async def _email_check_loop(self):
         """邮件检查循环"""
+        try:
+            await self._run_email_check_loop()
+        finally:
+            self._stopped.set()
+    
+    async def _run_email_check_loop(self):
+        """邮件检查循环主体"""
         while self.running:
             try:
                 logger.debug("开始检查新邮件")
@@ -116,20 +135,16 @@ class EmailTaskManager:
                 logger.error(f"邮件检查出错: {e}")
                 self.stats["errors_count"] += 1
             
-            # 等待下次检查
-            try:
-                await asyncio.sleep(settings.EMAIL_CHECK_INTERVAL)
-            except asyncio.CancelledError:
+            # 等待下次检查，收到停止信号时立即退出
+            if await self._wait_for_stop(settings.EMAIL_CHECK_INTERVAL):
                 break
     
     async def _maintenance_loop(self):
         """维护任务循环"""
         while self.running:
             try:
-                # 每小时运行一次维护任务
-                await asyncio.sleep(3600)  # 1小时
-                
-                if not self.running:
+                # 每小时运行一次维护任务，收到停止信号时立即退出
+                if await self._wait_for_stop(3600):  # 1小时
                     break
                 
                 logger.info("开始运行维护任务")
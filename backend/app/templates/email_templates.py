@@ -6,22 +6,102 @@
 
 import asyncio
 import logging
-from typing import Dict, Any, Optional, Union, List
+import os
+import re
+from types import MappingProxyType
+from typing import Dict, Any, Optional, Union, List, Mapping, Tuple
 from datetime import datetime
+from string import Formatter
 from pathlib import Path
 from functools import lru_cache
-import aiofiles
-from jinja2 import Environment, FileSystemLoader, select_autoescape, TemplateNotFound, Template
+from jinja2 import Environment, FileSystemLoader, TemplateNotFound, Template
+from markupsafe import escape
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# 文件大小单位（按1024进制递增）
+_SIZE_UNITS = ('B', 'KB', 'MB', 'GB', 'TB')
+
+# 处理状态到显示文本的映射（只读）
+_STATUS_TEXT = MappingProxyType({
+    'pending': '待处理',
+    'processing': '处理中',
+    'completed': '处理完成',
+    'rejected': '处理失败',
+    'failed': '处理失败',
+    'error': '处理错误'
+})
+
+
+# 纯变量占位符 {{ name }}
+_PLACEHOLDER_RE = re.compile(r'\{\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}\}')
+# 占位符以外的Jinja2语法（语句、注释、带过滤器或表达式的输出）
+_JINJA_SYNTAX_RE = re.compile(r'\{[{%#]')
+
+
+def _read_template_source(template_path: Path) -> Tuple[float, str]:
+    """读取模板文件的修改时间和内容（阻塞调用，在线程池中执行）"""
+    # 先取修改时间再读取：读取期间发生的修改会在下次检查时被发现
+    mtime = template_path.stat().st_mtime
+    return mtime, template_path.read_text(encoding='utf-8')
+
+
+def _stat_template_mtimes(template_dir: Path, filenames: List[str]) -> Dict[str, Optional[float]]:
+    """读取各模板文件的修改时间（阻塞调用，在线程池中执行），无法访问的文件记为None"""
+    mtimes: Dict[str, Optional[float]] = {}
+    for filename in filenames:
+        try:
+            mtimes[filename] = (template_dir / filename).stat().st_mtime
+        except OSError:
+            mtimes[filename] = None
+    return mtimes
+
 
 class EmailTemplateError(Exception):
     """邮件模板相关异常"""
     pass
 
 
+class SegmentTemplate:
+    """
+    只含 {{ name }} 占位符的模板：编译为字面量片段与变量名交替的列表，
+    渲染时直接拼接，无需经过Jinja2的上下文和异步生成器
+    """
+    
+    __slots__ = ('name', '_literals', '_names', '_escape')
+    
+    def __init__(self, name: str, literals: List[str], names: List[str], autoescape: bool):
+        self.name = name
+        self._literals = literals
+        self._names = names
+        self._escape = autoescape
+    
+    @classmethod
+    def compile(cls, name: str, source: str, autoescape: bool) -> Optional['SegmentTemplate']:
+        """编译模板源码；含其他Jinja2语法时返回None"""
+        # 与Jinja2一致：统一换行符，并去掉末尾的一个换行
+        source = source.replace('\r\n', '\n').replace('\r', '\n')
+        if source.endswith('\n'):
+            source = source[:-1]
+        
+        parts = _PLACEHOLDER_RE.split(source)
+        literals, names = parts[0::2], parts[1::2]
+        if any(_JINJA_SYNTAX_RE.search(literal) for literal in literals):
+            return None
+        return cls(name, literals, names, autoescape)
+    
+    def render(self, variables: Mapping[str, Any]) -> str:
+        """渲染模板；缺失的变量与Jinja2默认行为一致，输出为空字符串"""
+        literals = self._literals
+        chunks = [literals[0]]
+        for index, var_name in enumerate(self._names, 1):
+            value = variables.get(var_name, '')
+            chunks.append(str(escape(value)) if self._escape else str(value))
+            chunks.append(literals[index])
+        return ''.join(chunks)
+
+
 class EmailTemplateManager:
     """邮件模板管理器 - 支持异步操作和Jinja2模板引擎"""
     
@@ -29,29 +109,24 @@ class EmailTemplateManager:
         # 模板文件目录
         self.template_dir = Path(__file__).parent / "email"
         
-        # 初始化Jinja2环境
-        self.jinja_env = Environment(
-            loader=FileSystemLoader(str(self.template_dir)),
-            autoescape=select_autoescape(['html', 'xml']),
-            enable_async=True,
-            trim_blocks=True,
-            lstrip_blocks=True
-        )
+        # 初始化Jinja2环境：HTML模板开启自动转义，文本模板关闭
+        self._html_env = self._create_jinja_env(autoescape=True)
+        self._text_env = self._create_jinja_env(autoescape=False)
         
-        # 模板配置
+        # 模板配置（主题只是单行文本，使用str.format占位符，无需Jinja2）
         self.templates = {
             'tracker_confirmation': {
-                'subject_template': '文件上传确认 - Tracker ID: {{ tracker_id }}',
+                'subject_template': '文件上传确认 - Tracker ID: {tracker_id}',
                 'html_template': 'tracker_confirmation.html',
                 'text_template': 'tracker_confirmation.txt'
             },
             'upload_success': {
-                'subject_template': '文件处理完成通知 - {{ filename }}',
+                'subject_template': '文件处理完成通知 - {filename}',
                 'html_template': 'upload_success.html',
                 'text_template': 'upload_success.txt'
             },
             'upload_failed': {
-                'subject_template': '文件处理失败通知 - {{ filename }}',
+                'subject_template': '文件处理失败通知 - {filename}',
                 'html_template': 'upload_failed.html',
                 'text_template': 'upload_failed.txt'
             }
@@ -59,26 +134,72 @@ class EmailTemplateManager:
         
         # 缓存已加载的模板
         self._template_cache: Dict[str, Template] = {}
+        # 缓存模板文件内容（模板文件为静态文件，读取一次即可）
+        self._source_cache: Dict[str, str] = {}
+        # 模板文件读取时的修改时间，用于DEBUG模式下的热重载
+        self._source_mtimes: Dict[str, float] = {}
+        # DEBUG模式下每次渲染前按修改时间检查模板文件；生产环境渲染路径不做任何文件I/O
+        self._auto_reload = settings.DEBUG
+        # 邮件中用到的配置值（运行期间不变，避免每封邮件重复读取settings）
+        self._tracker_url_prefix = f"{settings.FRONTEND_URL}/tracker/"
+        self._support_email = settings.SUPPORT_EMAIL
+        self._system_name = settings.SYSTEM_NAME or "知识库上传系统"
+        
+        # 可用模板列表的只读快照（模板配置在运行期间不变）
+        self._available_templates = self._build_available_templates()
         self._initialized = False
+        # 进行中的初始化任务，并发的首次调用共享同一次初始化
+        self._init_task: Optional[asyncio.Task] = None
+    
+    def _create_jinja_env(self, autoescape: bool) -> Environment:
+        """创建Jinja2环境"""
+        return Environment(
+            loader=FileSystemLoader(str(self.template_dir)),
+            autoescape=autoescape,
+            enable_async=True,
+            trim_blocks=True,
+            lstrip_blocks=True
+        )
+    
+    def _get_jinja_env(self, filename: str) -> Environment:
+        """根据模板文件类型选择Jinja2环境"""
+        return self._html_env if filename.endswith(('.html', '.xml')) else self._text_env
     
     async def initialize(self) -> None:
-        """异步初始化模板管理器"""
-        if not self._initialized:
+        """异步初始化模板管理器（并发调用时只执行一次）"""
+        if self._initialized:
+            return
+        
+        if self._init_task is None:
+            self._init_task = asyncio.ensure_future(self._initialize_once())
+        
+        # shield：单个调用方被取消时不影响其他等待同一初始化的调用方
+        await asyncio.shield(self._init_task)
+    
+    async def _initialize_once(self) -> None:
+        """执行一次实际的初始化；失败时允许后续调用重试"""
+        try:
             await self._validate_template_files()
+            await self._compile_templates()
             self._initialized = True
+        finally:
+            self._init_task = None
     
     async def _validate_template_files(self) -> None:
         """异步验证模板文件是否存在"""
-        missing_files = []
+        all_filenames = [
+            config[key]
+            for config in self.templates.values()
+            for key in ('html_template', 'text_template')
+        ]
         
-        for template_name, config in self.templates.items():
-            html_path = self.template_dir / config['html_template']
-            text_path = self.template_dir / config['text_template']
-            
-            if not html_path.exists():
-                missing_files.append(str(html_path))
-            if not text_path.exists():
-                missing_files.append(str(text_path))
+        # 一次目录扫描取得全部文件名，代替逐个文件stat；在线程池中执行，避免阻塞事件循环
+        present = await asyncio.to_thread(self._list_template_files)
+        missing_files = [
+            str(self.template_dir / filename)
+            for filename in all_filenames
+            if filename not in present
+        ]
         
         if missing_files:
             error_msg = f"邮件模板文件缺失: {missing_files}"
@@ -87,12 +208,58 @@ class EmailTemplateManager:
         
         logger.info(f"邮件模板文件验证完成，模板目录: {self.template_dir}")
     
+    def _list_template_files(self) -> set:
+        """列出模板目录中的文件名；目录不存在时返回空集合"""
+        try:
+            with os.scandir(self.template_dir) as entries:
+                return {entry.name for entry in entries if entry.is_file()}
+        except FileNotFoundError:
+            return set()
+    
+    async def _compile_templates(self) -> None:
+        """读取并预编译所有配置的HTML和文本模板"""
+        for config in self.templates.values():
+            html_source = await self._load_template_file(config['html_template'])
+            text_source = await self._load_template_file(config['text_template'])
+            config['_html_compiled'] = self._compile_template_source(config['html_template'], html_source)
+            config['_text_compiled'] = self._compile_template_source(config['text_template'], text_source)
+    
+    def _compile_template_source(self, filename: str, source: str) -> Union[SegmentTemplate, Template]:
+        """
+        编译模板源码
+        
+        只含 {{ name }} 占位符的模板编译为SegmentTemplate直接拼接；
+        用到语句、过滤器等其他语法的模板编译为Jinja2模板对象
+        """
+        env = self._get_jinja_env(filename)
+        segment_template = SegmentTemplate.compile(filename, source, env.autoescape)
+        if segment_template is not None:
+            return segment_template
+        
+        try:
+            code = env.compile(source, name=filename, filename=filename)
+            return env.template_class.from_code(env, code, env.make_globals(None))
+        except Exception as e:
+            error_msg = f"编译Jinja2模板失败 {filename}: {e}"
+            logger.error(error_msg)
+            raise EmailTemplateError(error_msg)
+    
     async def _load_template_file(self, filename: str) -> str:
-        """异步加载模板文件内容"""
+        """
+        加载模板文件内容（带内存缓存）
+        
+        除初始化外，DEBUG模式的热重载也会在渲染路径上读取文件，
+        因此读取放在线程池中执行，不阻塞事件循环；每个文件每次变更只读取一次。
+        """
+        cached = self._source_cache.get(filename)
+        if cached is not None:
+            return cached
+        
         try:
-            template_path = self.template_dir / filename
-            async with aiofiles.open(template_path, 'r', encoding='utf-8') as f:
-                return await f.read()
+            mtime, content = await asyncio.to_thread(_read_template_source, self.template_dir / filename)
+            self._source_cache[filename] = content
+            self._source_mtimes[filename] = mtime
+            return content
         except FileNotFoundError:
             error_msg = f"模板文件不存在: {filename}"
             logger.error(error_msg)
@@ -102,11 +269,48 @@ class EmailTemplateManager:
             logger.error(error_msg)
             raise EmailTemplateError(error_msg)
     
+    async def _ensure_templates(self) -> None:
+        """确保模板已初始化；DEBUG模式下同时重新编译已修改的模板文件"""
+        if not self._initialized:
+            await self.initialize()
+        elif self._auto_reload:
+            await self._refresh_changed_templates()
+    
+    async def _refresh_changed_templates(self) -> None:
+        """按修改时间检查模板文件，只重新读取并编译发生变化的模板"""
+        template_files = [
+            (config, config[file_key], compiled_key)
+            for config in self.templates.values()
+            for file_key, compiled_key in (('html_template', '_html_compiled'), ('text_template', '_text_compiled'))
+        ]
+        # 所有模板文件的stat在一次线程调用中完成，不阻塞事件循环
+        mtimes = await asyncio.to_thread(
+            _stat_template_mtimes, self.template_dir, [filename for _, filename, _ in template_files]
+        )
+        
+        for config, filename, compiled_key in template_files:
+            mtime = mtimes[filename]
+            if mtime is None:
+                logger.warning(f"检查模板文件失败 {filename}")
+                continue
+            
+            if mtime == self._source_mtimes.get(filename):
+                continue
+            
+            self._source_cache.pop(filename, None)
+            try:
+                source = await self._load_template_file(filename)
+                config[compiled_key] = self._compile_template_source(filename, source)
+                logger.info(f"模板文件已变更，重新编译: {filename}")
+            except EmailTemplateError:
+                # 保留旧的编译结果，修改完成后会再次触发重新编译
+                continue
+    
     @lru_cache(maxsize=32)
     def _get_jinja_template(self, template_name: str) -> Template:
         """获取Jinja2模板对象（带缓存）"""
         try:
-            return self.jinja_env.get_template(template_name)
+            return self._get_jinja_env(template_name).get_template(template_name)
         except TemplateNotFound:
             error_msg = f"Jinja2模板不存在: {template_name}"
             logger.error(error_msg)
@@ -116,26 +320,58 @@ class EmailTemplateManager:
             logger.error(error_msg)
             raise EmailTemplateError(error_msg)
     
-    async def _render_template_async(self, template_name: str, variables: Dict[str, Any]) -> str:
-        """异步渲染Jinja2模板"""
+    async def _render_template_async(self, template: Union[SegmentTemplate, Template], variables: Dict[str, Any]) -> str:
+        """
+        异步渲染预编译的模板
+        
+        variables 直接作为共享上下文使用（Jinja2模板需已包含模板全局变量），
+        不再为每次渲染复制一份变量字典。
+        """
         try:
-            template = self._get_jinja_template(template_name)
-            return await template.render_async(**variables)
+            if isinstance(template, SegmentTemplate):
+                return template.render(variables)
+            
+            context = template.new_context(variables, shared=True)
+            return template.environment.concat(
+                [chunk async for chunk in template.root_render_func(context)]
+            )
         except Exception as e:
-            error_msg = f"异步模板渲染失败 {template_name}: {e}"
+            error_msg = f"异步模板渲染失败 {template.name}: {e}"
             logger.error(error_msg)
             raise EmailTemplateError(error_msg)
     
     def _render_subject_template(self, subject_template: str, variables: Dict[str, Any]) -> str:
-        """渲染主题模板（同步）"""
+        """渲染主题模板（同步，str.format_map）"""
         try:
-            template = Template(subject_template)
-            return template.render(**variables)
+            return subject_template.format_map(variables)
         except Exception as e:
             error_msg = f"主题模板渲染失败: {e}"
             logger.error(error_msg)
             raise EmailTemplateError(error_msg)
     
+    async def _render_email(self, template_config: Dict[str, Any], template_data: Dict[str, Any]) -> Dict[str, str]:
+        """
+        渲染一封邮件的主题、HTML正文和文本正文
+        
+        HTML和文本模板共享同一份渲染上下文依次渲染：两者都是纯CPU渲染，
+        在同一事件循环上并发不会更快，只会额外创建任务。
+        """
+        html_template = template_config['_html_compiled']
+        text_template = template_config['_text_compiled']
+        
+        # 只有Jinja2模板需要合并模板全局变量
+        render_vars = template_data
+        for template in (html_template, text_template):
+            if isinstance(template, Template):
+                render_vars = {**template.globals, **template_data}
+                break
+        
+        return {
+            'subject': self._render_subject_template(template_config['subject_template'], template_data),
+            'html_body': await self._render_template_async(html_template, render_vars),
+            'text_body': await self._render_template_async(text_template, render_vars)
+        }
+    
     async def get_tracker_confirmation_email(
         self, 
         tracker_id: str, 
@@ -155,33 +391,23 @@ class EmailTemplateManager:
         Returns:
             Dict[str, str]: 包含subject, html_body, text_body的字典
         """
-        await self.initialize()
+        await self._ensure_templates()
         
         template_data = {
             'tracker_id': tracker_id,
             'filename': filename,
             'file_size': self._format_file_size(file_size),
             'recipient_email': recipient_email,
-            'upload_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'query_url': f"{settings.FRONTEND_URL}/tracker/{tracker_id}",
-            'support_email': settings.SUPPORT_EMAIL,
-            'system_name': settings.SYSTEM_NAME or "知识库上传系统"
+            'upload_time': datetime.now().isoformat(sep=' ', timespec='seconds'),
+            'query_url': self._tracker_url_prefix + tracker_id,
+            'support_email': self._support_email,
+            'system_name': self._system_name
         }
         
         template_config = self.templates['tracker_confirmation']
         
         try:
-            # 并发渲染HTML和文本模板
-            html_task = self._render_template_async(template_config['html_template'], template_data)
-            text_task = self._render_template_async(template_config['text_template'], template_data)
-            
-            html_body, text_body = await asyncio.gather(html_task, text_task)
-            
-            return {
-                'subject': self._render_subject_template(template_config['subject_template'], template_data),
-                'html_body': html_body,
-                'text_body': text_body
-            }
+            return await self._render_email(template_config, template_data)
         except Exception as e:
             error_msg = f"生成Tracker确认邮件失败: {e}"
             logger.error(error_msg)
@@ -208,7 +434,7 @@ class EmailTemplateManager:
         Returns:
             Dict[str, str]: 包含subject, html_body, text_body的字典
         """
-        await self.initialize()
+        await self._ensure_templates()
         
         template_key = 'upload_success' if status == 'completed' else 'upload_failed'
         template_config = self.templates[template_key]
@@ -220,78 +446,99 @@ class EmailTemplateManager:
             'filename': filename,
             'status': status_text,
             'recipient_email': recipient_email,
-            'update_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'query_url': f"{settings.FRONTEND_URL}/tracker/{tracker_id}",
-            'support_email': settings.SUPPORT_EMAIL,
-            'system_name': settings.SYSTEM_NAME or "知识库上传系统",
+            'update_time': datetime.now().isoformat(sep=' ', timespec='seconds'),
+            'query_url': self._tracker_url_prefix + tracker_id,
+            'support_email': self._support_email,
+            'system_name': self._system_name,
             'error_message': error_message or ""
         }
         
         try:
-            # 并发渲染HTML和文本模板
-            html_task = self._render_template_async(template_config['html_template'], template_data)
-            text_task = self._render_template_async(template_config['text_template'], template_data)
-            
-            html_body, text_body = await asyncio.gather(html_task, text_task)
-            
-            return {
-                'subject': self._render_subject_template(template_config['subject_template'], template_data),
-                'html_body': html_body,
-                'text_body': text_body
-            }
+            return await self._render_email(template_config, template_data)
         except Exception as e:
             error_msg = f"生成状态更新邮件失败: {e}"
             logger.error(error_msg)
             raise EmailTemplateError(error_msg)
     
+    async def render_many(self, template_key: str, rows: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """
+        批量渲染同一模板的多封邮件（用于批量通知）
+        
+        模板只查找一次，初始化检查也只做一次；每行数据缺省的
+        system_name、support_email 和 query_url 由管理器补齐。
+        
+        Args:
+            template_key: 模板名称，如 'upload_success'
+            rows: 每封邮件的模板数据
+            
+        Returns:
+            List[Dict[str, str]]: 与rows一一对应，包含subject, html_body, text_body的字典
+        """
+        await self._ensure_templates()
+        
+        template_config = self.templates.get(template_key)
+        if template_config is None:
+            raise EmailTemplateError(f"模板不存在: {template_key}")
+        
+        defaults = {
+            'support_email': self._support_email,
+            'system_name': self._system_name
+        }
+        
+        try:
+            results = []
+            for row in rows:
+                template_data = {**defaults, **row}
+                if 'query_url' not in template_data and 'tracker_id' in template_data:
+                    template_data['query_url'] = self._tracker_url_prefix + template_data['tracker_id']
+                results.append(await self._render_email(template_config, template_data))
+            return results
+        except Exception as e:
+            error_msg = f"批量渲染邮件失败 {template_key}: {e}"
+            logger.error(error_msg)
+            raise EmailTemplateError(error_msg)
+    
     def _format_file_size(self, size_bytes: int) -> str:
         """格式化文件大小"""
         if size_bytes < 0:
             return "0 B"
         
-        units = ['B', 'KB', 'MB', 'GB', 'TB']
-        size = float(size_bytes)
-        unit_index = 0
+        size_bytes = int(size_bytes)
+        if size_bytes < 1024:
+            return f"{size_bytes} B"
         
-        while size >= 1024 and unit_index < len(units) - 1:
-            size /= 1024
-            unit_index += 1
-        
-        if unit_index == 0:
-            return f"{int(size)} {units[unit_index]}"
-        else:
-            return f"{size:.1f} {units[unit_index]}"
+        # 单位索引即 floor(log1024(size))，由最高位位置直接得出
+        unit_index = min((size_bytes.bit_length() - 1) // 10, len(_SIZE_UNITS) - 1)
+        return f"{size_bytes / (1 << (unit_index * 10)):.1f} {_SIZE_UNITS[unit_index]}"
     
     def _get_status_text(self, status: str) -> str:
         """获取状态文本"""
-        status_mapping = {
-            'pending': '待处理',
-            'processing': '处理中',
-            'completed': '处理完成',
-            'rejected': '处理失败',
-            'failed': '处理失败',
-            'error': '处理错误'
-        }
-        return status_mapping.get(status.lower(), status)
+        # 状态通常已是小写，命中时无需再分配lower()后的字符串
+        text = _STATUS_TEXT.get(status)
+        if text is not None:
+            return text
+        return _STATUS_TEXT.get(status.lower(), status)
     
     async def reload_templates(self) -> None:
         """异步重新加载模板文件（用于开发和调试）"""
         try:
             # 清除缓存
             self._template_cache.clear()
+            self._source_cache.clear()
+            self._source_mtimes.clear()
             self._get_jinja_template.cache_clear()
             
             # 重新验证模板文件
             await self._validate_template_files()
             
             # 重新创建Jinja2环境
-            self.jinja_env = Environment(
-                loader=FileSystemLoader(str(self.template_dir)),
-                autoescape=select_autoescape(['html', 'xml']),
-                enable_async=True,
-                trim_blocks=True,
-                lstrip_blocks=True
-            )
+            self._html_env = self._create_jinja_env(autoescape=True)
+            self._text_env = self._create_jinja_env(autoescape=False)
+            
+            # 基于新环境重新读取并预编译模板
+            await self._compile_templates()
+            self._available_templates = self._build_available_templates()
+            self._initialized = True
             
             logger.info("邮件模板重新加载成功")
         except Exception as e:
@@ -299,16 +546,20 @@ class EmailTemplateManager:
             logger.error(error_msg)
             raise EmailTemplateError(error_msg)
     
-    def get_available_templates(self) -> Dict[str, Dict[str, str]]:
-        """获取可用的模板列表"""
-        return {
-            name: {
+    def _build_available_templates(self) -> Mapping[str, Mapping[str, str]]:
+        """构建可用模板列表的只读快照"""
+        return MappingProxyType({
+            name: MappingProxyType({
                 'subject_template': config['subject_template'],
                 'html_template': config['html_template'],
                 'text_template': config['text_template']
-            }
+            })
             for name, config in self.templates.items()
-        }
+        })
+    
+    def get_available_templates(self) -> Mapping[str, Mapping[str, str]]:
+        """获取可用的模板列表（只读视图，重复调用返回同一对象）"""
+        return self._available_templates
     
     async def validate_template_syntax(self, template_name: str) -> Dict[str, Union[bool, str]]:
         """验证模板语法"""
@@ -326,8 +577,8 @@ class EmailTemplateManager:
             # 验证文本模板
             self._get_jinja_template(config['text_template'])
             
-            # 验证主题模板
-            Template(config['subject_template'])
+            # 验证主题模板（解析str.format占位符）
+            list(Formatter().parse(config['subject_template']))
             
         except Exception as e:
             result['valid'] = False
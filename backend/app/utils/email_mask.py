@@ -2,6 +2,18 @@
 邮箱脱敏工具函数
 """
 
+import re
+
+
+# 邮箱正则表达式（模块加载时编译一次）
+_EMAIL_RE = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b')
+
+# 按用户名长度索引的 (保留前缀长度, 保留后缀长度)，其余字符用*替换
+_MASK_KEEP = ((1, 0), (1, 0), (1, 0), (1, 0), (1, 1), (1, 1), (1, 1))
+# 用户名长度 >= 7 时的保留规则
+_MASK_KEEP_LONG = (2, 2)
+
+
 def mask_email_address(email: str) -> str:
     """
     对邮箱地址进行脱敏处理
@@ -14,43 +26,26 @@ def mask_email_address(email: str) -> str:
     - test@example.org -> te*t@example.org
     - a@domain.com -> a***@domain.com
     """
-    if not email or '@' not in email:
+    if not email:
         return email
     
-    try:
-        username, domain = email.split('@', 1)
-        
-        if len(username) <= 3:
-            # 短用户名：保留第一个字符，其余用*替换
-            masked_username = username[0] + '*' * (len(username) - 1)
-        elif len(username) <= 6:
-            # 中等长度：保留前1个和后1个字符
-            masked_username = username[0] + '*' * (len(username) - 2) + username[-1]
-        else:
-            # 长用户名：保留前2个和后2个字符
-            masked_username = username[:2] + '*' * (len(username) - 4) + username[-2:]
-        
-        return f"{masked_username}@{domain}"
-    
-    except Exception:
-        # 如果处理失败，返回通用脱敏格式
+    at = email.find('@')
+    if at < 0:
+        return email
+    if at == 0:
+        # 用户名为空，返回通用脱敏格式
         return "***@domain.com"
+    
+    prefix, suffix = _MASK_KEEP[at] if at < len(_MASK_KEEP) else _MASK_KEEP_LONG
+    return f"{email[:prefix]}{'*' * (at - prefix - suffix)}{email[at - suffix:at]}{email[at:]}"
 
 
 def mask_email_from_subject(subject: str) -> str:
     """
     从邮件主题中提取并脱敏邮箱地址
     """
-    if not subject:
+    # 不含'@'的文本不可能包含邮箱，先做一次C层面的子串扫描，跳过正则匹配
+    if not subject or '@' not in subject:
         return subject
     
-    import re
-    
-    # 邮箱正则表达式
-    email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-    
-    def replace_email(match):
-        email = match.group(0)
-        return mask_email_address(email)
-    
-    return re.sub(email_pattern, replace_email, subject)
+    return _EMAIL_RE.sub(lambda match: mask_email_address(match.group(0)), subject)
@@ -6,6 +6,15 @@
 import re
 
 
+# 邮箱格式校验正则（模块加载时编译一次）
+_VALID_EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+# 按用户名长度索引的 (保留前缀长度, 星号数量, 保留后缀长度)
+_MASK_RULES = ((0, 1, 0), (0, 1, 0), (1, 1, 0), (1, 1, 0), (2, 2, 1), (2, 2, 1), (2, 2, 1))
+# 用户名长度 >= 7 时的脱敏规则
+_MASK_RULE_LONG = (3, 2, 2)
+
+
 def mask_email(email: str) -> str:
     """
     对邮箱地址进行脱敏处理
@@ -22,31 +31,16 @@ def mask_email(email: str) -> str:
     - liusoee@gmail.com -> liu**ee@gmail.com
     - verylongname@gmail.com -> ver**me@gmail.com
     """
-    if not email or '@' not in email:
+    if not email:
         return email
     
-    try:
-        username, domain = email.split('@', 1)
-        username_len = len(username)
-        
-        if username_len <= 1:
-            # 用户名太短，只显示*
-            masked_username = '*'
-        elif username_len <= 3:
-            # 短用户名：显示第一个字符 + *
-            masked_username = username[0] + '*'
-        elif username_len <= 6:
-            # 中等用户名：显示前2个 + ** + 后1个
-            masked_username = username[:2] + '**' + username[-1:]
-        else:
-            # 长用户名：显示前3个 + ** + 后2个
-            masked_username = username[:3] + '**' + username[-2:]
-        
-        return f"{masked_username}@{domain}"
+    # '@' 的位置即用户名长度
+    at = email.find('@')
+    if at < 0:
+        return email
     
-    except Exception:
-        # 如果处理失败，返回完全脱敏的邮箱
-        return "***@***"
+    prefix, stars, suffix = _MASK_RULES[at] if at < len(_MASK_RULES) else _MASK_RULE_LONG
+    return f"{email[:prefix]}{'*' * stars}{email[at - suffix:at]}{email[at:]}"
 
 
 def is_valid_email(email: str) -> bool:
@@ -57,8 +51,7 @@ def is_valid_email(email: str) -> bool:
         return False
     
     # 简单的邮箱正则验证
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return bool(re.match(pattern, email))
+    return bool(_VALID_EMAIL_RE.match(email))
 
 
 # 测试用例（仅在直接运行此文件时执行）
@@ -3,12 +3,24 @@
 提供tracker_id生成和管理功能
 """
 
+import re
+import time
 import uuid
-import hashlib
-from datetime import datetime
+import secrets
+from bisect import bisect_left
+from datetime import datetime, timezone
 from typing import Optional
 
 
+# 跟踪ID有效字符：字母、数字、短横线（校验前统一转为大写）
+_TRACKER_ID_CHARS_RE = re.compile(r'[A-Z0-9-]+')
+
+# 年龄描述的秒数分界：超过1分钟、超过1小时、满1天（配合bisect_left使用）
+_AGE_THRESHOLDS = (60, 3600, 86399)
+# 与分界对应的 (单位秒数, 描述后缀)，索引0表示"刚刚"
+_AGE_UNITS = ((1, ""), (60, "分钟前"), (3600, "小时前"), (86400, "天前"))
+
+
 def generate_tracker_id(prefix: str = "TRK") -> str:
     """
     生成唯一的跟踪ID
@@ -19,8 +31,8 @@ def generate_tracker_id(prefix: str = "TRK") -> str:
     Returns:
         str: 格式化的跟踪ID
     """
-    # 生成UUID4
-    unique_id = str(uuid.uuid4())
+    # 生成UUID4（使用无连字符的hex形式）
+    unique_id = uuid.uuid4().hex
     
     # 取UUID的前8位和后4位，用短横线连接
     short_id = f"{unique_id[:8]}-{unique_id[-4:]}"
@@ -41,13 +53,8 @@ def generate_simple_tracker_id() -> str:
     Returns:
         str: 12位的跟踪ID
     """
-    # 生成UUID并取MD5哈希
-    unique_id = str(uuid.uuid4())
-    hash_obj = hashlib.md5(unique_id.encode())
-    hash_hex = hash_obj.hexdigest()
-    
-    # 取前12位并转为大写
-    return hash_hex[:12].upper()
+    # 直接生成6字节（48位）随机数，即12位十六进制字符
+    return secrets.token_hex(6).upper()
 
 
 def validate_tracker_id(tracker_id: str) -> bool:
@@ -67,12 +74,8 @@ def validate_tracker_id(tracker_id: str) -> bool:
     if len(tracker_id) < 8 or len(tracker_id) > 36:
         return False
     
-    # 检查是否包含有效字符（字母、数字、短横线）
-    valid_chars = set('ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-')
-    if not all(c in valid_chars for c in tracker_id.upper()):
-        return False
-    
-    return True
+    # 检查是否包含有效字符（字母、数字、短横线），由正则引擎一次扫描完成
+    return _TRACKER_ID_CHARS_RE.fullmatch(tracker_id.upper()) is not None
 
 
 def format_tracker_display(tracker_id: str) -> str:
@@ -118,6 +121,27 @@ def extract_timestamp_from_tracker(tracker_id: str) -> Optional[datetime]:
         return None
 
 
+def _to_epoch_seconds(created_at: datetime) -> float:
+    """将创建时间转为epoch秒数（无时区信息的时间按UTC处理，与数据库存储一致）"""
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return created_at.timestamp()
+
+
+def is_expired_tracker_epoch(created_ts: float, days: int = 30) -> bool:
+    """
+    基于epoch秒数检查跟踪ID是否已过期
+    
+    Args:
+        created_ts: 创建时间的epoch秒数
+        days: 过期天数，默认30天
+        
+    Returns:
+        bool: 是否已过期
+    """
+    return time.time() - created_ts > days * 86400
+
+
 def is_expired_tracker(created_at: datetime, days: int = 30) -> bool:
     """
     检查跟踪ID是否已过期
@@ -132,9 +156,7 @@ def is_expired_tracker(created_at: datetime, days: int = 30) -> bool:
     if not created_at:
         return True
     
-    from datetime import timedelta
-    expiry_date = created_at + timedelta(days=days)
-    return datetime.utcnow() > expiry_date
+    return is_expired_tracker_epoch(_to_epoch_seconds(created_at), days)
 
 
 def get_tracker_age_description(created_at: datetime) -> str:
@@ -150,16 +172,11 @@ def get_tracker_age_description(created_at: datetime) -> str:
     if not created_at:
         return "未知"
     
-    now = datetime.utcnow()
-    diff = now - created_at
-    
-    if diff.days > 0:
-        return f"{diff.days}天前"
-    elif diff.seconds > 3600:
-        hours = diff.seconds // 3600
-        return f"{hours}小时前"
-    elif diff.seconds > 60:
-        minutes = diff.seconds // 60
-        return f"{minutes}分钟前"
-    else:
-        return "刚刚"
\ No newline at end of file
+    seconds = int(time.time() - _to_epoch_seconds(created_at))
+    
+    index = bisect_left(_AGE_THRESHOLDS, seconds)
+    if index == 0:
+        return "刚刚"
+    
+    unit_seconds, suffix = _AGE_UNITS[index]
+    return f"{seconds // unit_seconds}{suffix}"
\ No newline at end of file
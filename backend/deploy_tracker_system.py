@@ -3,18 +3,35 @@
 自动化部署和验证跟踪系统功能
 """
 
+import argparse
 import asyncio
-import subprocess
+import socket
 import sys
 import os
 import time
+from importlib.util import find_spec
 from pathlib import Path
 
+# HTTP客户端在脚本启动时导入；缺失时置为None，由对应步骤给出提示
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# 生产环境启动命令：多worker + uvloop事件循环 + httptools解析器，不使用--reload
+PRODUCTION_SERVER_COMMAND = (
+    "uvicorn main:app --workers $(nproc) --loop uvloop --http httptools "
+    "--host 0.0.0.0 --port 8000 --log-level warning"
+)
+
 class TrackerSystemDeployer:
-    def __init__(self):
+    def __init__(self, assume_yes: bool = False, server_wait_timeout: float = 60):
         self.project_root = Path(__file__).parent
+        # 非交互模式：所有确认提示自动回答"是"
+        self.assume_yes = assume_yes
+        self.server_wait_timeout = server_wait_timeout
         self.migration_script = self.project_root / "migrations" / "add_tracker_fields.py"
-        self.test_script = self.project_root / "test_tracker_integration.py"
+        self.test_script = self.project_root / "tests" / "test_tracker_integration.py"
     
     def print_step(self, step: str, message: str):
         """打印部署步骤"""
@@ -33,7 +50,7 @@ class TrackerSystemDeployer:
         """打印警告信息"""
         print(f"⚠️  {message}")
     
-    def check_dependencies(self):
+    async def check_dependencies(self):
         """检查依赖项"""
         self.print_step("依赖检查", "检查必要的依赖项...")
         
@@ -50,15 +67,26 @@ class TrackerSystemDeployer:
             "sqlalchemy",
             "asyncpg",
             "pydantic",
-            "uvicorn"
+            "uvicorn",
+            "httptools",
+            "orjson"
         ]
         
+        # uvloop不支持Windows
+        if sys.platform != "win32":
+            required_packages.append("uvloop")
+        
+        # 只查找模块规格，不真正执行包的导入；find_spec需要扫描sys.path，
+        # 放到线程中执行，不阻塞同时进行的数据库检查
+        installed = await asyncio.to_thread(
+            lambda: [find_spec(package) is not None for package in required_packages]
+        )
+        
         missing_packages = []
-        for package in required_packages:
-            try:
-                __import__(package)
+        for package, found in zip(required_packages, installed):
+            if found:
                 self.print_success(f"包 {package} 已安装")
-            except ImportError:
+            else:
                 missing_packages.append(package)
                 self.print_error(f"包 {package} 未安装")
         
@@ -68,38 +96,31 @@ class TrackerSystemDeployer:
         
         return True
     
-    def check_database_connection(self):
+    async def check_database_connection(self):
         """检查数据库连接"""
         self.print_step("数据库检查", "检查数据库连接...")
         
         try:
             # 尝试导入数据库相关模块
-            from app.core.database import get_db_session
-            
-            async def test_connection():
-                try:
-                    async with get_db_session() as db:
-                        await db.execute("SELECT 1")
-                        return True
-                except Exception as e:
-                    self.print_error(f"数据库连接失败: {e}")
-                    return False
-            
-            # 运行连接测试
-            result = asyncio.run(test_connection())
-            
-            if result:
-                self.print_success("数据库连接正常")
-                return True
-            else:
-                return False
-                
+            from sqlalchemy import text
+            from app.core.database import AsyncSessionLocal
         except Exception as e:
             self.print_error(f"数据库模块导入失败: {e}")
             return False
+        
+        # 在部署流程共享的事件循环中运行连接测试
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(text("SELECT 1"))
+        except Exception as e:
+            self.print_error(f"数据库连接失败: {e}")
+            return False
+        
+        self.print_success("数据库连接正常")
+        return True
     
-    def run_database_migration(self):
-        """运行数据库迁移"""
+    async def run_database_migration(self):
+        """运行数据库迁移（在当前进程和事件循环中直接执行迁移函数）"""
         self.print_step("数据库迁移", "添加跟踪系统字段...")
         
         if not self.migration_script.exists():
@@ -107,72 +128,93 @@ class TrackerSystemDeployer:
             return False
         
         try:
-            # 运行迁移脚本
-            result = subprocess.run([
-                sys.executable, 
-                str(self.migration_script), 
-                "full"
-            ], capture_output=True, text=True, cwd=self.project_root)
+            from migrations.add_tracker_fields import add_tracker_fields, update_existing_records
             
-            if result.returncode == 0:
-                self.print_success("数据库迁移完成")
-                print(result.stdout)
-                return True
-            else:
-                self.print_error("数据库迁移失败")
-                print(result.stderr)
-                return False
+            # 完整迁移：添加字段 + 更新现有记录
+            await add_tracker_fields()
+            await update_existing_records()
+            
+            self.print_success("数据库迁移完成")
+            return True
                 
         except Exception as e:
-            self.print_error(f"运行迁移脚本失败: {e}")
+            self.print_error(f"数据库迁移失败: {e}")
             return False
     
-    def start_backend_server(self):
+    def is_server_listening(self, host: str = "127.0.0.1", port: int = 8000) -> bool:
+        """通过TCP连接判断后端端口是否已在监听（不触发任何HTTP处理）"""
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.settimeout(1)
+            return sock.connect_ex((host, port)) == 0
+    
+    async def wait_for_server(self, url: str = "http://localhost:8000/health", timeout: float = 60) -> bool:
+        """
+        轮询等待后端服务可响应（指数退避，不阻塞事件循环）
+        
+        Args:
+            url: 探测地址，默认使用轻量的/health端点
+            timeout: 最长等待秒数
+            
+        Returns:
+            bool: 超时前服务是否返回200
+        """
+        deadline = time.monotonic() + timeout
+        backoff = 0.25
+        
+        async with httpx.AsyncClient(timeout=1) as client:
+            while time.monotonic() < deadline:
+                try:
+                    response = await client.get(url)
+                    if response.status_code == 200:
+                        return True
+                except httpx.HTTPError:
+                    pass
+                
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 1.5, 2.0)
+        
+        return False
+    
+    async def start_backend_server(self):
         """启动后端服务器"""
         self.print_step("后端服务", "启动FastAPI服务器...")
         
         try:
-            # 检查服务器是否已经运行
-            import requests
-            try:
-                response = requests.get("http://localhost:8000/docs", timeout=5)
-                if response.status_code == 200:
-                    self.print_success("后端服务器已在运行")
-                    return True
-            except:
-                pass
+            # 检查服务器是否已经运行（TCP探测，避免渲染/docs）
+            if self.is_server_listening():
+                self.print_success("后端服务器已在运行")
+                return True
+            
+            if httpx is None:
+                self.print_error("缺少httpx包，无法检查后端服务器")
+                return False
             
             # 启动服务器
             self.print_warning("正在启动后端服务器...")
-            self.print_warning("请在另一个终端运行: uvicorn main:app --reload --host 0.0.0.0 --port 8000")
+            self.print_warning(f"请在另一个终端运行: {PRODUCTION_SERVER_COMMAND}")
+            self.print_warning(f"等待后端服务器就绪（最长 {self.server_wait_timeout:g} 秒）...")
             
-            # 等待用户确认
-            input("启动后端服务器后，按回车键继续...")
+            # 轮询/health直到服务可响应，无需人工确认
+            if await self.wait_for_server(timeout=self.server_wait_timeout):
+                self.print_success("后端服务器运行正常")
+                return True
             
-            # 再次检查
-            try:
-                response = requests.get("http://localhost:8000/docs", timeout=10)
-                if response.status_code == 200:
-                    self.print_success("后端服务器运行正常")
-                    return True
-                else:
-                    self.print_error("后端服务器响应异常")
-                    return False
-            except Exception as e:
-                self.print_error(f"无法连接到后端服务器: {e}")
-                return False
+            self.print_error("等待后端服务器超时")
+            return False
                 
         except Exception as e:
             self.print_error(f"启动后端服务器失败: {e}")
             return False
     
-    def check_api_endpoints(self):
-        """检查API端点"""
+    async def check_api_endpoints(self):
+        """检查API端点（复用同一个连接池，并发探测所有端点）"""
         self.print_step("API检查", "验证跟踪系统API端点...")
         
+        if httpx is None:
+            self.print_error("缺少httpx包，无法检查API端点")
+            return False
+        
         try:
-            import requests
-            
             # 检查健康端点
             endpoints = [
                 ("GET", "/api/v1/tracker/health", "健康检查"),
@@ -180,23 +222,26 @@ class TrackerSystemDeployer:
                 ("POST", "/api/v1/tracker/query", "POST查询")
             ]
             
-            for method, endpoint, description in endpoints:
-                try:
-                    url = f"http://localhost:8000{endpoint}"
-                    
-                    if method == "GET":
-                        response = requests.get(url, timeout=10)
-                    elif method == "POST":
-                        response = requests.post(url, json={"tracker_id": "test"}, timeout=10)
-                    
-                    # 检查响应（404也是正常的，说明端点存在）
-                    if response.status_code in [200, 404, 422]:
-                        self.print_success(f"{description} 端点正常")
-                    else:
-                        self.print_warning(f"{description} 端点响应异常: {response.status_code}")
-                        
-                except Exception as e:
-                    self.print_error(f"{description} 端点检查失败: {e}")
+            async with httpx.AsyncClient(
+                base_url="http://localhost:8000",
+                timeout=10,
+                limits=httpx.Limits(max_keepalive_connections=8)
+            ) as client:
+                tasks = [
+                    client.get(endpoint) if method == "GET"
+                    else client.post(endpoint, json={"tracker_id": "test"})
+                    for method, endpoint, _ in endpoints
+                ]
+                results = await asyncio.gather(*tasks, return_exceptions=True)
+            
+            for (_, _, description), response in zip(endpoints, results):
+                if isinstance(response, Exception):
+                    self.print_error(f"{description} 端点检查失败: {response}")
+                # 检查响应（404也是正常的，说明端点存在）
+                elif response.status_code in [200, 404, 422]:
+                    self.print_success(f"{description} 端点正常")
+                else:
+                    self.print_warning(f"{description} 端点响应异常: {response.status_code}")
             
             return True
             
@@ -204,8 +249,8 @@ class TrackerSystemDeployer:
             self.print_error(f"API端点检查失败: {e}")
             return False
     
-    def run_integration_tests(self):
-        """运行集成测试"""
+    async def run_integration_tests(self):
+        """运行集成测试（子进程输出逐行实时转发）"""
         self.print_step("集成测试", "运行跟踪系统集成测试...")
         
         if not self.test_script.exists():
@@ -213,13 +258,27 @@ class TrackerSystemDeployer:
             return False
         
         try:
-            # 运行测试脚本
-            result = subprocess.run([
-                sys.executable, 
-                str(self.test_script)
-            ], cwd=self.project_root, input="\n", text=True)
+            # 运行测试脚本，stderr合并到stdout一起流式读取
+            proc = await asyncio.create_subprocess_exec(
+                sys.executable,
+                str(self.test_script),
+                cwd=self.project_root,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT
+            )
+            
+            # 测试脚本启动时等待回车确认
+            proc.stdin.write(b"\n")
+            await proc.stdin.drain()
+            proc.stdin.close()
             
-            if result.returncode == 0:
+            async for line in proc.stdout:
+                print(line.decode(errors="replace"), end="")
+            
+            returncode = await proc.wait()
+            
+            if returncode == 0:
                 self.print_success("集成测试通过")
                 return True
             else:
@@ -254,10 +313,11 @@ class TrackerSystemDeployer:
 - POST /api/v1/tracker/query - POST方式查询
 
 🚀 下一步:
-1. 启动前端服务: cd frontend && npm run dev
-2. 访问跟踪页面: http://localhost:3000/tracker
-3. 测试文件上传并获取跟踪ID
-4. 使用跟踪ID查询状态
+1. 启动后端服务（生产模式）: {PRODUCTION_SERVER_COMMAND}
+2. 启动前端服务: cd frontend && npm run dev
+3. 访问跟踪页面: http://localhost:3000/tracker
+4. 测试文件上传并获取跟踪ID
+5. 使用跟踪ID查询状态
 
 📞 支持:
 如有问题，请检查:
@@ -275,33 +335,70 @@ class TrackerSystemDeployer:
         
         self.print_success(f"部署摘要已保存到: {summary_file}")
     
-    def deploy(self):
-        """执行完整部署流程"""
+    def confirm(self, prompt: str) -> bool:
+        """询问用户确认；非交互模式下直接返回True"""
+        if self.assume_yes:
+            return True
+        return input(prompt).lower() == 'y'
+    
+    def handle_step_result(self, step_name: str, step_ok: bool, failed_steps: list) -> bool:
+        """记录步骤结果；关键步骤失败时询问是否继续，返回False表示取消部署"""
+        if step_ok:
+            return True
+        
+        failed_steps.append(step_name)
+        
+        # 对于关键步骤，询问是否继续
+        if step_name in ["检查依赖", "检查数据库", "数据库迁移"]:
+            if not self.confirm(f"\n{step_name}失败，是否继续部署？(y/N): "):
+                self.print_error("部署已取消")
+                return False
+        
+        return True
+    
+    async def deploy(self):
+        """执行完整部署流程（所有异步步骤共享同一个事件循环）"""
         print("🚀 跟踪系统自动化部署")
         print("=" * 60)
         
+        failed_steps = []
+        
+        # 依赖检查与数据库检查互不依赖，并发执行
+        precheck_names = ["检查依赖", "检查数据库"]
+        try:
+            precheck_results = await asyncio.gather(
+                self.check_dependencies(),
+                self.check_database_connection(),
+                return_exceptions=True
+            )
+        except KeyboardInterrupt:
+            self.print_error("部署被用户中断")
+            return False
+        
+        for step_name, result in zip(precheck_names, precheck_results):
+            if isinstance(result, Exception):
+                self.print_error(f"{step_name}执行异常: {result}")
+                failed_steps.append(step_name)
+            elif not self.handle_step_result(step_name, result, failed_steps):
+                return False
+        
+        # 其余步骤存在先后依赖（迁移 → 服务 → API → 测试），依次执行
         steps = [
-            ("检查依赖", self.check_dependencies),
-            ("检查数据库", self.check_database_connection),
             ("数据库迁移", self.run_database_migration),
             ("启动后端", self.start_backend_server),
             ("检查API", self.check_api_endpoints),
             ("集成测试", self.run_integration_tests),
         ]
         
-        failed_steps = []
-        
         for step_name, step_func in steps:
             try:
-                if not step_func():
-                    failed_steps.append(step_name)
-                    
-                    # 对于关键步骤，询问是否继续
-                    if step_name in ["检查依赖", "检查数据库", "数据库迁移"]:
-                        continue_deploy = input(f"\n{step_name}失败，是否继续部署？(y/N): ")
-                        if continue_deploy.lower() != 'y':
-                            self.print_error("部署已取消")
-                            return False
+                if asyncio.iscoroutinefunction(step_func):
+                    step_ok = await step_func()
+                else:
+                    step_ok = step_func()
+                
+                if not self.handle_step_result(step_name, step_ok, failed_steps):
+                    return False
                 
             except KeyboardInterrupt:
                 self.print_error("部署被用户中断")
@@ -322,17 +419,30 @@ class TrackerSystemDeployer:
 
 def main():
     """主函数"""
-    deployer = TrackerSystemDeployer()
+    parser = argparse.ArgumentParser(description="跟踪系统部署工具")
+    parser.add_argument(
+        "-y", "--yes",
+        action="store_true",
+        help="非交互模式，所有确认提示自动回答是（适用于CI/无人值守部署）"
+    )
+    parser.add_argument(
+        "--server-timeout",
+        type=float,
+        default=60,
+        help="等待后端服务器就绪的最长秒数（默认60）"
+    )
+    args = parser.parse_args()
+    
+    deployer = TrackerSystemDeployer(assume_yes=args.yes, server_wait_timeout=args.server_timeout)
     
     print("欢迎使用跟踪系统部署工具")
     print("此工具将自动部署和配置资源上传跟踪系统")
     
-    confirm = input("\n是否开始部署？(y/N): ")
-    if confirm.lower() != 'y':
+    if not deployer.confirm("\n是否开始部署？(y/N): "):
         print("部署已取消")
         return
     
-    success = deployer.deploy()
+    success = asyncio.run(deployer.deploy())
     
     if success:
         print("\n🎊 部署成功！系统已准备就绪。")
@@ -6,15 +6,17 @@ GitHub上传分类智能前端系统后端API
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
+from sqlalchemy import inspect
 import time
 import logging
 
 from app.core.config import settings
-from app.core.database import engine, Base
+from app.core.database import engine, Base, check_db_health, close_db
 from app.api.v1.api import api_router
 from app.services.email_service import email_service
+from app.services.redis_service import redis_service
 from app.tasks.email_tasks import email_task_manager
 from app.core.init_admin import init_admin
 
@@ -32,7 +34,7 @@ async def lifespan(app: FastAPI):
     # 启动时执行
     logger.info("正在启动 KB Upload Genie 后端服务...")
     
-    # 确保上传目录存在并设置正确权限
+    # 确保上传目录存在；仅在新建目录时设置权限，已存在的目录只做一次可写性检查
     import os
     from pathlib import Path
     
@@ -40,22 +42,22 @@ async def lifespan(app: FastAPI):
     email_attachments_dir = upload_dir / "email_attachments"
     
     try:
-        # 创建目录
-        upload_dir.mkdir(parents=True, exist_ok=True)
-        email_attachments_dir.mkdir(parents=True, exist_ok=True)
+        for directory in (upload_dir, email_attachments_dir):
+            if not directory.exists():
+                directory.mkdir(parents=True, exist_ok=True)
+                # 设置目录权限（775 = rwxrwxr-x）
+                os.chmod(directory, 0o775)
+                logger.info(f"目录创建成功: {directory}")
         
-        # 设置目录权限（775 = rwxrwxr-x）
-        os.chmod(upload_dir, 0o775)
-        os.chmod(email_attachments_dir, 0o775)
-        
-        logger.info(f"上传目录创建成功: {upload_dir}")
-        logger.info(f"邮件附件目录创建成功: {email_attachments_dir}")
-        
-        # 测试写入权限
-        test_file = upload_dir / ".permission_test"
-        test_file.write_text("test")
-        test_file.unlink()  # 删除测试文件
-        logger.info("上传目录写入权限测试通过")
+        not_writable = [
+            str(directory) for directory in (upload_dir, email_attachments_dir)
+            if not os.access(directory, os.W_OK)
+        ]
+        if not_writable:
+            logger.error(f"上传目录不可写: {', '.join(not_writable)}")
+            logger.warning("将尝试使用当前权限继续运行")
+        else:
+            logger.info("上传目录写入权限检查通过")
         
     except PermissionError as e:
         logger.error(f"上传目录权限设置失败: {e}")
@@ -63,9 +65,15 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"上传目录创建失败: {e}")
     
-    # 创建数据库表
+    # 创建数据库表：先一次性读取现有表名，只有存在缺失的表时才执行create_all
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+        existing_tables = set(
+            await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_table_names())
+        )
+        missing_tables = set(Base.metadata.tables) - existing_tables
+        if missing_tables:
+            logger.info(f"创建缺失的数据库表: {', '.join(sorted(missing_tables))}")
+            await conn.run_sync(Base.metadata.create_all)
     
     logger.info("数据库初始化完成")
     
@@ -98,6 +106,16 @@ async def lifespan(app: FastAPI):
         logger.info("邮件检查任务已停止")
         await email_service.disconnect_imap()
         logger.info("邮件服务IMAP连接已断开")
+    
+    # 关闭Redis连接
+    try:
+        await redis_service.close()
+        logger.info("Redis连接已关闭")
+    except Exception as e:
+        logger.error(f"关闭Redis连接失败: {e}")
+    
+    # 释放数据库连接池
+    await close_db()
 
 
 # 创建FastAPI应用实例
@@ -108,6 +126,8 @@ app = FastAPI(
     docs_url="/docs" if settings.DEBUG else None,
     redoc_url="/redoc" if settings.DEBUG else None,
     lifespan=lifespan,
+    # 全局使用orjson序列化响应
+    default_response_class=ORJSONResponse,
     # 修复SwaggerUI静态资源问题
     swagger_ui_parameters={
         "syntaxHighlight.theme": "obsidian",
@@ -134,14 +154,37 @@ if not settings.DEBUG:
     )
 
 
+# 健康检查响应缓存时间（秒），高频探测在此时间内直接复用上次的响应内容
+HEALTH_CACHE_TTL = 2.0
+_health_cache = {"ts": 0.0, "body": None}
+
+
+async def _health_payload() -> dict:
+    """健康检查响应内容（数据库探测结果由check_db_health缓存）"""
+    now = time.monotonic()
+    if _health_cache["body"] is not None and now - _health_cache["ts"] < HEALTH_CACHE_TTL:
+        return _health_cache["body"]
+    
+    db_ok = await check_db_health()
+    body = {
+        "status": "healthy" if db_ok else "degraded",
+        "service": "KB Upload Genie API",
+        "version": "1.0.0",
+        "database": "ok" if db_ok else "unavailable",
+        "timestamp": time.time()
+    }
+    _health_cache["ts"] = now
+    _health_cache["body"] = body
+    return body
+
+
 # 请求处理时间中间件
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
     """添加请求处理时间到响应头"""
-    start_time = time.time()
+    start_time = time.perf_counter_ns()
     response = await call_next(request)
-    process_time = time.time() - start_time
-    response.headers["X-Process-Time"] = str(process_time)
+    response.headers["X-Process-Time"] = str((time.perf_counter_ns() - start_time) / 1e9)
     return response
 
 
@@ -150,7 +193,7 @@ async def add_process_time_header(request: Request, call_next):
 async def global_exception_handler(request: Request, exc: Exception):
     """全局异常处理器"""
     logger.error(f"全局异常: {exc}", exc_info=True)
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={
             "detail": "内部服务器错误",
@@ -162,13 +205,9 @@ async def global_exception_handler(request: Request, exc: Exception):
 # 健康检查端点
 @app.get("/health")
 async def health_check():
-    """健康检查端点"""
-    return {
-        "status": "healthy",
-        "service": "KB Upload Genie API",
-        "version": "1.0.0",
-        "timestamp": time.time()
-    }
+    """健康检查端点；数据库不可用（degraded）时返回503，便于探针区分"""
+    body = await _health_payload()
+    return ORJSONResponse(body, status_code=200 if body["status"] == "healthy" else 503)
 
 
 # 根路径
@@ -188,6 +227,7 @@ app.include_router(api_router, prefix="/api/v1")
 
 
 if __name__ == "__main__":
+    import sys
     import uvicorn
     
     uvicorn.run(
@@ -195,5 +235,8 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=8002,
         reload=settings.DEBUG,
-        log_level="info"
+        log_level="info",
+        # uvloop不支持Windows，此时退回标准asyncio事件循环
+        loop="uvloop" if sys.platform != "win32" else "asyncio",
+        http="httptools"
     )
\ No newline at end of file
@@ -5,7 +5,28 @@
 
 import asyncio
 from sqlalchemy import text
-from app.core.database import get_db_session
+from app.core.database import AsyncSessionLocal, engine
+
+async def _execute_script(db, sql: str):
+    """
+    在会话当前事务中一次性执行多语句SQL
+    asyncpg的预处理语句不支持多条命令，这里直接使用驱动连接的简单查询协议发送
+    """
+    conn = await db.connection()
+    # SQLAlchemy的asyncpg适配器在首次经由它执行语句时才开启事务，直接调用驱动连接不会开启；
+    # 先经适配器执行一条语句开启事务，使脚本与会话处于同一事务中，失败时随会话一起回滚
+    await conn.exec_driver_sql("SELECT 1")
+    raw_conn = await conn.get_raw_connection()
+    await raw_conn.driver_connection.execute(sql)
+
+async def _create_index_concurrently(sql: str):
+    """
+    使用独立的自动提交连接创建索引
+    CREATE INDEX CONCURRENTLY 不能在事务中执行，且构建期间不阻塞写入
+    """
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text(sql))
 
 async def add_tracker_fields():
     """添加跟踪相关字段到articles表"""
@@ -23,13 +44,13 @@ async def add_tracker_fields():
     
     # 创建索引以提高查询性能
     create_tracker_index = """
-    CREATE INDEX IF NOT EXISTS idx_articles_tracker_id 
-    ON articles(tracker_id);
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_articles_tracker_id 
+    ON articles(tracker_id)
     """
     
     create_method_index = """
-    CREATE INDEX IF NOT EXISTS idx_articles_method 
-    ON articles(method);
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_articles_method 
+    ON articles(method)
     """
     
     # 添加处理状态字段（如果不存在）
@@ -39,36 +60,34 @@ async def add_tracker_fields():
     """
     
     create_processing_status_index = """
-    CREATE INDEX IF NOT EXISTS idx_articles_processing_status 
-    ON articles(processing_status);
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_articles_processing_status 
+    ON articles(processing_status)
     """
     
+    # 字段变更合并为一段多语句SQL，在同一事务中一次发送
+    migration_sql = ";\n".join(
+        sql.strip().rstrip(";") for sql in (
+            add_method_field,
+            add_tracker_id_field,
+            add_processing_status_field,
+        )
+    )
+    
     try:
-        async with get_db_session() as db:
+        async with AsyncSessionLocal() as db:
             print("开始添加跟踪字段...")
             
-            # 执行字段添加
-            await db.execute(text(add_method_field))
-            print("✓ 添加method字段")
-            
-            await db.execute(text(add_tracker_id_field))
-            print("✓ 添加tracker_id字段")
-            
-            await db.execute(text(add_processing_status_field))
-            print("✓ 添加processing_status字段")
-            
-            # 创建索引
-            await db.execute(text(create_tracker_index))
-            print("✓ 创建tracker_id索引")
-            
-            await db.execute(text(create_method_index))
-            print("✓ 创建method索引")
-            
-            await db.execute(text(create_processing_status_index))
-            print("✓ 创建processing_status索引")
-            
+            await _execute_script(db, migration_sql)
             await db.commit()
-            print("✅ 数据库迁移完成")
+            print("✓ 添加method、tracker_id、processing_status字段")
+        
+        # 索引在事务外以CONCURRENTLY方式构建，不阻塞articles表的写入
+        # 同一张表上的CONCURRENTLY构建会互相等待表锁，因此依次执行
+        for index_sql in (create_tracker_index, create_method_index, create_processing_status_index):
+            await _create_index_concurrently(index_sql)
+        print("✓ 创建tracker_id、method、processing_status索引")
+        
+        print("✅ 数据库迁移完成")
             
     except Exception as e:
         print(f"❌ 数据库迁移失败: {e}")
@@ -89,9 +108,9 @@ async def rollback_tracker_fields():
     """
     
     try:
-        async with get_db_session() as db:
+        async with AsyncSessionLocal() as db:
             print("开始回滚跟踪字段...")
-            await db.execute(text(rollback_sql))
+            await _execute_script(db, rollback_sql)
             await db.commit()
             print("✅ 回滚完成")
             
@@ -102,43 +121,39 @@ async def rollback_tracker_fields():
 async def update_existing_records():
     """更新现有记录，为它们生成tracker_id"""
     
-    from app.utils.tracker_utils import generate_tracker_id
+    # 与generate_tracker_id("LEGACY")格式一致：LEGACY-<uuid前8位>-<uuid后4位>-<时间戳后4位>，
+    # 全部在数据库端生成，一条语句完成回填
+    backfill_sql = """
+    UPDATE articles 
+    SET tracker_id = upper(
+            'LEGACY-' || left(u.hex, 8) || '-' || right(u.hex, 4) || '-'
+            || right(floor(extract(epoch FROM now()))::bigint::text, 4)
+        ),
+        method = 'legacy_import',
+        processing_status = 'completed'
+    FROM (
+        SELECT id, replace(gen_random_uuid()::text, '-', '') AS hex
+        FROM articles 
+        WHERE tracker_id IS NULL
+    ) AS u
+    WHERE articles.id = u.id
+    """
     
     try:
-        async with get_db_session() as db:
+        async with AsyncSessionLocal() as db:
             print("开始更新现有记录...")
             
-            # 查询没有tracker_id的记录
-            result = await db.execute(text("""
-                SELECT id FROM articles 
-                WHERE tracker_id IS NULL 
-                LIMIT 1000
-            """))
+            # gen_random_uuid() 在PostgreSQL 13以前由pgcrypto提供
+            await db.execute(text("CREATE EXTENSION IF NOT EXISTS pgcrypto"))
             
-            records = result.fetchall()
+            result = await db.execute(text(backfill_sql))
+            await db.commit()
             
-            if not records:
+            if not result.rowcount:
                 print("✓ 没有需要更新的记录")
                 return
             
-            print(f"找到 {len(records)} 条需要更新的记录")
-            
-            # 批量更新
-            for record in records:
-                tracker_id = generate_tracker_id("LEGACY")
-                await db.execute(text("""
-                    UPDATE articles 
-                    SET tracker_id = :tracker_id, 
-                        method = 'legacy_import',
-                        processing_status = 'completed'
-                    WHERE id = :id
-                """), {
-                    "tracker_id": tracker_id,
-                    "id": record.id
-                })
-            
-            await db.commit()
-            print(f"✅ 成功更新 {len(records)} 条记录")
+            print(f"✅ 成功更新 {result.rowcount} 条记录")
             
     except Exception as e:
         print(f"❌ 更新现有记录失败: {e}")
@@ -22,13 +22,10 @@ async def restart_email_service():
     logger.info("🔄 开始重启邮件检查服务...")
     
     try:
-        # 停止当前的邮件检查任务
+        # 停止当前的邮件检查任务（返回时任务已完全退出）
         logger.info("⏹️ 停止当前邮件检查任务...")
         await email_task_manager.stop_email_checking()
         
-        # 等待一小段时间确保任务完全停止
-        await asyncio.sleep(2)
-        
         # 重新启动邮件检查任务
         if settings.EMAIL_UPLOAD_ENABLED:
             logger.info("▶️ 重新启动邮件检查任务...")
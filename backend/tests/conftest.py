@@ -18,10 +18,11 @@ import os
 from unittest.mock import Mock, patch
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 from fastapi.testclient import TestClient
 
 from main import app
-from app.core.database import Base, get_db
+from app.core.database import Base, get_db, close_db
 from app.core.config import settings
 
 
@@ -39,10 +40,12 @@ async def test_engine():
     # 使用内存SQLite数据库进行测试
     test_database_url = "sqlite+aiosqlite:///:memory:"
     
+    # 内存数据库只存在于单个连接中：StaticPool让所有会话复用这一个连接
     engine = create_async_engine(
         test_database_url,
         echo=False,
-        future=True
+        future=True,
+        poolclass=StaticPool
     )
     
     # 创建所有表
@@ -55,14 +58,28 @@ async def test_engine():
     await engine.dispose()
 
 
-@pytest.fixture
-async def test_db_session(test_engine):
-    """创建测试数据库会话"""
-    async_session = sessionmaker(
+@pytest.fixture(scope="session")
+def test_session_factory(test_engine):
+    """测试数据库会话工厂，与测试引擎一样在整个会话内共享"""
+    return sessionmaker(
         test_engine, class_=AsyncSession, expire_on_commit=False
     )
-    
-    async with async_session() as session:
+
+
+@pytest.fixture(scope="session", autouse=True)
+async def _dispose_app_engines():
+    """
+    会话结束时释放应用引擎（get_db/AsyncSessionLocal使用）的连接池
+    连接池在整个测试会话内复用，必须在会话级事件循环关闭前释放
+    """
+    yield
+    await close_db()
+
+
+@pytest.fixture
+async def test_db_session(test_session_factory):
+    """创建测试数据库会话"""
+    async with test_session_factory() as session:
         yield session
 
 
@@ -74,12 +91,21 @@ def override_get_db(test_db_session):
     
     app.dependency_overrides[get_db] = _override_get_db
     yield
+
+
+@pytest.fixture(autouse=True)
+def _reset_dependency_overrides():
+    """每个测试结束后清空依赖覆盖，使共享的测试客户端在测试之间保持隔离"""
+    yield
     app.dependency_overrides.clear()
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def test_client():
-    """创建测试客户端"""
+    """
+    创建测试客户端（整个测试会话共享）
+    不进入with块，因此不会执行应用lifespan（建表、初始化管理员、启动邮件检查任务）
+    """
     return TestClient(app)
 
 
@@ -105,30 +131,68 @@ def mock_redis():
         yield mock_redis
 
 
+# 邮件测试使用的配置覆盖值
+_MOCK_EMAIL_SETTINGS = {
+    'EMAIL_UPLOAD_ENABLED': True,
+    'SMTP_HOST': "smtp.test.com",
+    'SMTP_PORT': 587,
+    'SMTP_USER': "test@test.com",
+    'SMTP_PASSWORD': "password",
+    'SMTP_TLS': True,
+    'IMAP_HOST': "imap.test.com",
+    'IMAP_PORT': 993,
+    'IMAP_USER': "test@test.com",
+    'IMAP_PASSWORD': "password",
+    'IMAP_USE_SSL': True,
+    'EMAIL_MAX_ATTACHMENT_SIZE': 10*1024*1024,
+    'EMAIL_MAX_ATTACHMENT_COUNT': 5,
+    'EMAIL_ALLOWED_EXTENSIONS': ['.pdf', '.docx', '.txt'],
+    'EMAIL_HOURLY_LIMIT': 5,
+    'EMAIL_DAILY_LIMIT': 20,
+    'EMAIL_ALLOWED_DOMAINS': ['test.com', 'example.com'],
+}
+
+
 @pytest.fixture
 def mock_email_settings():
-    """模拟邮件配置"""
-    with patch.multiple(
-        settings,
-        EMAIL_UPLOAD_ENABLED=True,
-        SMTP_HOST="smtp.test.com",
-        SMTP_PORT=587,
-        SMTP_USER="test@test.com",
-        SMTP_PASSWORD="password",
-        SMTP_TLS=True,
-        IMAP_HOST="imap.test.com",
-        IMAP_PORT=993,
-        IMAP_USER="test@test.com",
-        IMAP_PASSWORD="password",
-        IMAP_USE_SSL=True,
-        EMAIL_MAX_ATTACHMENT_SIZE=10*1024*1024,
-        EMAIL_MAX_ATTACHMENT_COUNT=5,
-        EMAIL_ALLOWED_EXTENSIONS=['.pdf', '.docx', '.txt'],
-        EMAIL_HOURLY_LIMIT=5,
-        EMAIL_DAILY_LIMIT=20,
-        EMAIL_ALLOWED_DOMAINS=['test.com', 'example.com']
-    ):
+    """模拟邮件配置（一次保存原值、覆盖，结束后统一恢复）"""
+    saved = {name: getattr(settings, name) for name in _MOCK_EMAIL_SETTINGS}
+    for name, value in _MOCK_EMAIL_SETTINGS.items():
+        # 列表类配置复制一份，避免测试修改影响后续用例
+        setattr(settings, name, list(value) if isinstance(value, list) else value)
+    try:
         yield
+    finally:
+        for name, value in saved.items():
+            setattr(settings, name, value)
+
+
+@pytest.fixture(scope="session")
+async def smtp_conn():
+    """
+    整个测试会话共享的SMTP连接，会话结束时断开
+    连接挂在email_service上：业务代码经smtp_session发送时会直接复用它，不会将其断开
+    未配置SMTP或连接失败时为None，依赖它的测试应自行跳过
+    """
+    from app.services.email_service import email_service
+    
+    try:
+        connected = await email_service.connect_smtp()
+    except Exception:
+        connected = False
+    
+    yield email_service.smtp_connection if connected else None
+    
+    if connected:
+        await email_service.disconnect_smtp()
+
+
+@pytest.fixture
+def smtp(smtp_conn):
+    """需要真实SMTP服务器的测试使用；不可用时跳过"""
+    if smtp_conn is None:
+        pytest.skip("SMTP服务器未配置或无法连接")
+    return smtp_conn
 
 
 @pytest.fixture
@@ -148,6 +212,19 @@ def sample_email_data():
     }
 
 
+@pytest.fixture(scope="session")
+async def sample_rendered_email():
+    """渲染一次的Tracker确认邮件（subject/html_body/text_body），整个测试会话共享"""
+    from app.templates.email_templates import email_template_manager
+    
+    return await email_template_manager.get_tracker_confirmation_email(
+        tracker_id="TEST_12345",
+        filename="test_document.pdf",
+        file_size=1024000,  # 1MB
+        recipient_email="test@example.com"
+    )
+
+
 @pytest.fixture
 def sample_attachment_data():
     """示例附件数据"""
@@ -177,19 +254,18 @@ def pytest_configure(config):
 
 
 # 测试收集钩子
+# 测试名包含关键字时自动添加对应标记（异步测试由pytest.ini中的asyncio_mode = auto处理）
+_NAME_MARKERS = (
+    ("performance", pytest.mark.performance),
+    ("integration", pytest.mark.integration),
+    ("slow", pytest.mark.slow),
+)
+
+
 def pytest_collection_modifyitems(config, items):
     """修改测试项目"""
     for item in items:
-        # 为异步测试添加asyncio标记
-        if asyncio.iscoroutinefunction(item.function):
-            item.add_marker(pytest.mark.asyncio)
-        
-        # 根据测试名称自动添加标记
-        if "test_performance" in item.name or "performance" in item.name:
-            item.add_marker(pytest.mark.performance)
-        
-        if "test_integration" in item.name or "integration" in item.name:
-            item.add_marker(pytest.mark.integration)
-        
-        if "slow" in item.name:
-            item.add_marker(pytest.mark.slow)
\ No newline at end of file
+        name = item.name
+        for keyword, marker in _NAME_MARKERS:
+            if keyword in name:
+                item.add_marker(marker)
@@ -16,12 +16,12 @@ def test_imports():
     try:
         print("开始测试模型导入...")
         
-        # 测试基础模型导入
-        from app.models import User, Category, Article, Review, CopyrightRecord
+        # 基础模型和枚举类型一次导入（导入失败仍由下方except捕获并报告）
+        from app.models import (
+            User, Category, Article, Review, CopyrightRecord,
+            UserRole, ArticleStatus, ReviewType, CopyrightStatus
+        )
         print("✓ 基础模型导入成功")
-        
-        # 测试枚举导入
-        from app.models import UserRole, ArticleStatus, ReviewType, CopyrightStatus
         print("✓ 枚举类型导入成功")
         
         # 测试表名
@@ -5,6 +5,7 @@
 """
 
 import asyncio
+import operator
 import sys
 import os
 from datetime import datetime
@@ -20,13 +21,17 @@ from app.templates.email_templates import email_template_manager
 from app.core.config import settings
 
 
+# 模拟数据使用的固定时间：这些记录是合成数据，不需要真实的当前时间
+_FIXED_NOW = datetime(2024, 1, 1)
+
+
 async def test_email_template_generation():
     """测试邮件模板生成"""
     print("=== 测试邮件模板生成 ===")
     
     try:
         # 测试Tracker确认邮件模板
-        email_content = email_template_manager.get_tracker_confirmation_email(
+        email_content = await email_template_manager.get_tracker_confirmation_email(
             tracker_id="TEST_TRACKER_001",
             filename="test_document.pdf",
             file_size=1024 * 1024,  # 1MB
@@ -39,7 +44,7 @@ async def test_email_template_generation():
         print(f"文本内容长度: {len(email_content['text_body'])} 字符")
         
         # 测试状态更新邮件模板
-        status_email = email_template_manager.get_upload_status_email(
+        status_email = await email_template_manager.get_upload_status_email(
             tracker_id="TEST_TRACKER_001",
             status="completed",
             filename="test_document.pdf",
@@ -99,10 +104,10 @@ async def test_email_service_integration():
             print("❌ _send_confirmation_emails 方法不存在")
             return False
         
-        # 检查save_email_records方法是否已更新
-        import inspect
-        source = inspect.getsource(email_service.save_email_records)
-        if '_send_confirmation_emails' in source:
+        # 检查save_email_records方法是否已更新：直接查看编译后代码引用的属性名，
+        # 无需读取并解析源文件，注释或字符串中出现的方法名也不会误判
+        referenced_names = email_service.save_email_records.__code__.co_names
+        if '_send_confirmation_emails' in referenced_names:
             print("✅ save_email_records 已集成确认邮件发送")
         else:
             print("❌ save_email_records 未集成确认邮件发送")
@@ -130,13 +135,15 @@ async def test_configuration():
             'STATUS_UPDATE_EMAIL_ENABLED'
         ]
         
-        for item in config_items:
-            if hasattr(settings, item):
-                value = getattr(settings, item)
-                print(f"✅ {item}: {value}")
-            else:
-                print(f"❌ {item}: 配置项不存在")
-                return False
+        # 一次取出全部配置值；任一配置项不存在时抛出AttributeError
+        try:
+            values = operator.attrgetter(*config_items)(settings)
+        except AttributeError as e:
+            print(f"❌ 配置项不存在: {e}")
+            return False
+        
+        for item, value in zip(config_items, values):
+            print(f"✅ {item}: {value}")
         
         return True
         
@@ -156,7 +163,7 @@ async def simulate_email_processing():
                 'sender_email': 'test@example.com',
                 'sender_email_hash': 'test_hash_123',
                 'subject': '测试文档上传',
-                'received_at': datetime.now(),
+                'received_at': _FIXED_NOW,
                 'attachments': [
                     {
                         'original_filename': 'test_document.pdf',
@@ -214,13 +221,25 @@ async def test_smtp_connection():
         return False
 
 
+# 脚本模式下同时运行的测试数上限
+MAX_CONCURRENT_TESTS = 8
+
+
+async def _run_test(semaphore: asyncio.BoundedSemaphore, test_name: str, test_func) -> tuple:
+    """在并发上限内运行单个测试，异常记为失败"""
+    async with semaphore:
+        try:
+            return test_name, await test_func()
+        except Exception as e:
+            print(f"❌ {test_name} 测试异常: {e}")
+            return test_name, False
+
+
 async def main():
     """主测试函数"""
     print("开始测试自动回复功能...")
     print("=" * 50)
     
-    test_results = []
-    
     # 运行所有测试
     tests = [
         ("邮件模板生成", test_email_template_generation),
@@ -231,13 +250,11 @@ async def main():
         ("SMTP连接配置", test_smtp_connection)
     ]
     
-    for test_name, test_func in tests:
-        try:
-            result = await test_func()
-            test_results.append((test_name, result))
-        except Exception as e:
-            print(f"❌ {test_name} 测试异常: {e}")
-            test_results.append((test_name, False))
+    # 各测试相互独立，并发运行；gather按tests的顺序返回结果
+    semaphore = asyncio.BoundedSemaphore(MAX_CONCURRENT_TESTS)
+    test_results = await asyncio.gather(
+        *(_run_test(semaphore, test_name, test_func) for test_name, test_func in tests)
+    )
     
     # 输出测试结果汇总
     print("\n" + "=" * 50)
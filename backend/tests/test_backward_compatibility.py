@@ -4,32 +4,127 @@
 """
 
 import asyncio
-import json
-import requests
+import httpx
+import orjson
+import pytest
+import re
 from datetime import datetime
-from typing import Dict, Any, List
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+# 已解析的OpenAPI文档缓存：base_url -> (ETag, 文档)，同一进程内重复运行时避免重复下载
+_openapi_spec_cache: Dict[str, Tuple[Optional[str], Dict[str, Any]]] = {}
+# 正在进行中的OpenAPI文档请求：并发的相同请求合并为一次上游调用
+_openapi_inflight: Dict[str, asyncio.Future] = {}
+
+# 失败测试名称中的关键词 -> 对应的改进建议
+_RECOMMENDATION_RULES = (
+    ("端点", "检查API端点配置和路由设置"),
+    ("数据库", "验证数据库迁移是否正确执行"),
+    ("模型", "检查数据模型定义和字段映射"),
+    ("前端", "确保前端服务正常运行并检查路由配置"),
+    ("配置", "检查环境变量和配置文件设置"),
+)
+
+# 所有关键词合并为一个预编译的正则分支，一次扫描即可找出名称中出现的关键词
+_RECOMMENDATION_RE = re.compile("|".join(re.escape(keyword) for keyword, _ in _RECOMMENDATION_RULES))
+
+# 各项兼容性检查（BackwardCompatibilityTest上的方法名），既供run_all_tests串联运行，也作为pytest参数化用例
+COMPATIBILITY_CHECKS = (
+    "test_existing_upload_endpoints",
+    "test_email_upload_compatibility",
+    "test_admin_endpoints_compatibility",
+    "test_database_schema_compatibility",
+    "test_api_documentation_compatibility",
+    "test_frontend_routes_compatibility",
+    "test_environment_variables_compatibility",
+)
 
 class BackwardCompatibilityTest:
     def __init__(self):
         self.base_url = "http://localhost:8000"
         self.api_base = f"{self.base_url}/api/v1"
-        self.test_results = []
+        
+        # 测试结果按列存储：汇总与筛选只需扫描所需的列
+        self.names: List[str] = []
+        self.successes: List[bool] = []
+        self.messages: List[str] = []
+        self.data: List[Any] = []
+        self.timestamps: List[datetime] = []
+        
+        # 所有请求共用一个异步客户端：保持长连接，各测试方法并发执行时复用连接池
+        self.aclient = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=10,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+            # 声明接受压缩响应（经nginx代理时JSON会被gzip压缩）；未安装brotli，不声明br
+            headers={"Accept-Encoding": "gzip, deflate"}
+        )
     
     def log_test(self, test_name: str, success: bool, message: str, data: Any = None):
         """记录测试结果"""
-        result = {
-            "test_name": test_name,
-            "success": success,
-            "message": message,
-            "data": data,
-            "timestamp": datetime.now().isoformat()
-        }
-        self.test_results.append(result)
+        self.names.append(test_name)
+        self.successes.append(success)
+        self.messages.append(message)
+        self.data.append(data)
+        self.timestamps.append(datetime.now())
         
         status = "✅" if success else "❌"
         print(f"{status} {test_name}: {message}")
     
-    def test_existing_upload_endpoints(self):
+    def to_dict_list(self) -> List[Dict[str, Any]]:
+        """将按列存储的测试结果转换为逐条字典（仅用于输出JSON报告）"""
+        return [
+            {
+                "test_name": name,
+                "success": success,
+                "message": message,
+                "data": data,
+                "timestamp": timestamp
+            }
+            for name, success, message, data, timestamp in zip(
+                self.names, self.successes, self.messages, self.data, self.timestamps
+            )
+        ]
+    
+    async def _get_openapi_spec(self) -> Tuple[int, Optional[Dict[str, Any]]]:
+        """
+        获取OpenAPI文档，返回(HTTP状态码, 解析后的文档)
+        同一base_url已有请求在进行时直接等待其结果，不再重复请求
+        """
+        inflight = _openapi_inflight.get(self.base_url)
+        if inflight is None:
+            inflight = asyncio.ensure_future(self._fetch_openapi_spec())
+            _openapi_inflight[self.base_url] = inflight
+            inflight.add_done_callback(lambda _: _openapi_inflight.pop(self.base_url, None))
+        return await asyncio.shield(inflight)
+    
+    async def _fetch_openapi_spec(self) -> Tuple[int, Optional[Dict[str, Any]]]:
+        """
+        请求OpenAPI文档
+        已缓存时携带If-None-Match，服务端返回304则直接使用缓存
+        """
+        cached = _openapi_spec_cache.get(self.base_url)
+        headers = {"If-None-Match": cached[0]} if cached and cached[0] else {}
+        
+        response = await self.aclient.get(f"{self.base_url}/openapi.json", headers=headers, timeout=10)
+        
+        if response.status_code == 304 and cached:
+            return 200, cached[1]
+        if response.status_code != 200:
+            return response.status_code, None
+        
+        if response.headers.get("Content-Encoding"):
+            print(
+                f"📦 OpenAPI文档传输 {response.num_bytes_downloaded} 字节"
+                f"（{response.headers['Content-Encoding']}，解压后 {len(response.content)} 字节）"
+            )
+        
+        spec = response.json()
+        _openapi_spec_cache[self.base_url] = (response.headers.get("ETag"), spec)
+        return 200, spec
+    
+    async def test_existing_upload_endpoints(self):
         """测试现有上传端点是否正常工作"""
         print("\n🔍 测试现有上传端点...")
         
@@ -38,7 +133,7 @@ class BackwardCompatibilityTest:
         files = {'file': ('test_compatibility.txt', test_content, 'text/plain')}
         
         try:
-            response = requests.post(f"{self.api_base}/upload", files=files, timeout=30)
+            response = await self.aclient.post(f"{self.api_base}/upload", files=files, timeout=30)
             
             if response.status_code == 200:
                 data = response.json()
@@ -84,13 +179,13 @@ class BackwardCompatibilityTest:
         except Exception as e:
             self.log_test("主上传端点兼容性", False, f"请求异常: {str(e)}")
     
-    def test_email_upload_compatibility(self):
+    async def test_email_upload_compatibility(self):
         """测试邮件上传功能兼容性"""
         print("\n📧 测试邮件上传兼容性...")
         
         # 测试邮件上传列表端点
         try:
-            response = requests.get(f"{self.api_base}/email-upload/uploads", timeout=10)
+            response = await self.aclient.get(f"{self.api_base}/email-upload/uploads", timeout=10)
             
             if response.status_code == 200:
                 data = response.json()
@@ -120,7 +215,7 @@ class BackwardCompatibilityTest:
         
         # 测试简单邮件上传端点
         try:
-            response = requests.get(f"{self.api_base}/simple-email/api/uploads", timeout=10)
+            response = await self.aclient.get(f"{self.api_base}/simple-email/api/uploads", timeout=10)
             
             if response.status_code == 200:
                 self.log_test(
@@ -138,13 +233,13 @@ class BackwardCompatibilityTest:
         except Exception as e:
             self.log_test("简单邮件上传兼容性", False, f"请求异常: {str(e)}")
     
-    def test_admin_endpoints_compatibility(self):
+    async def test_admin_endpoints_compatibility(self):
         """测试管理员端点兼容性"""
         print("\n👨‍💼 测试管理员端点兼容性...")
         
         # 测试管理员登录端点（不实际登录，只检查端点存在）
         try:
-            response = requests.post(
+            response = await self.aclient.post(
                 f"{self.api_base}/auth/login", 
                 json={"email": "test@example.com", "password": "invalid"},
                 timeout=10
@@ -167,7 +262,7 @@ class BackwardCompatibilityTest:
         except Exception as e:
             self.log_test("管理员登录端点兼容性", False, f"请求异常: {str(e)}")
     
-    def test_database_schema_compatibility(self):
+    async def test_database_schema_compatibility(self):
         """测试数据库模式兼容性"""
         print("\n🗄️ 测试数据库模式兼容性...")
         
@@ -176,11 +271,11 @@ class BackwardCompatibilityTest:
             from app.models.email_upload import EmailUpload
             from app.models.simple_email_upload import SimpleEmailUpload
             
-            # 检查Article模型是否有新字段
-            article_fields = [attr for attr in dir(Article) if not attr.startswith('_')]
+            # 检查Article模型是否有新字段（直接读取表的列名，无需对模型做完整的dir()内省）
+            article_fields = set(Article.__table__.columns.keys())
             
             required_new_fields = ['method', 'tracker_id', 'processing_status']
-            missing_fields = [field for field in required_new_fields if field not in article_fields]
+            missing_fields = sorted(set(required_new_fields) - article_fields)
             
             if not missing_fields:
                 self.log_test(
@@ -222,16 +317,15 @@ class BackwardCompatibilityTest:
         except Exception as e:
             self.log_test("数据库模式兼容性", False, f"模型导入失败: {str(e)}")
     
-    def test_api_documentation_compatibility(self):
+    async def test_api_documentation_compatibility(self):
         """测试API文档兼容性"""
         print("\n📚 测试API文档兼容性...")
         
         try:
             # 检查OpenAPI文档
-            response = requests.get(f"{self.base_url}/openapi.json", timeout=10)
+            status_code, openapi_spec = await self._get_openapi_spec()
             
-            if response.status_code == 200:
-                openapi_spec = response.json()
+            if status_code == 200:
                 
                 # 检查是否包含新的跟踪端点
                 paths = openapi_spec.get('paths', {})
@@ -242,10 +336,7 @@ class BackwardCompatibilityTest:
                     '/api/v1/tracker/query'
                 ]
                 
-                missing_endpoints = []
-                for endpoint in tracker_endpoints:
-                    if endpoint not in paths:
-                        missing_endpoints.append(endpoint)
+                missing_endpoints = sorted(set(tracker_endpoints) - paths.keys())
                 
                 if not missing_endpoints:
                     self.log_test(
@@ -267,10 +358,7 @@ class BackwardCompatibilityTest:
                     '/api/v1/auth/login'
                 ]
                 
-                missing_existing = []
-                for endpoint in existing_endpoints:
-                    if endpoint not in paths:
-                        missing_existing.append(endpoint)
+                missing_existing = sorted(set(existing_endpoints) - paths.keys())
                 
                 if not missing_existing:
                     self.log_test(
@@ -288,13 +376,13 @@ class BackwardCompatibilityTest:
                 self.log_test(
                     "API文档兼容性", 
                     False, 
-                    f"无法获取API文档: HTTP {response.status_code}"
+                    f"无法获取API文档: HTTP {status_code}"
                 )
                 
         except Exception as e:
             self.log_test("API文档兼容性", False, f"请求异常: {str(e)}")
     
-    def test_frontend_routes_compatibility(self):
+    async def test_frontend_routes_compatibility(self):
         """测试前端路由兼容性"""
         print("\n🌐 测试前端路由兼容性...")
         
@@ -308,9 +396,9 @@ class BackwardCompatibilityTest:
             ("/tracker", "跟踪查询页面")  # 新添加的路由
         ]
         
-        for route, description in routes_to_test:
+        async def _probe(client: httpx.AsyncClient, route: str, description: str):
             try:
-                response = requests.get(f"{frontend_url}{route}", timeout=10)
+                response = await client.get(route)
                 
                 if response.status_code == 200:
                     self.log_test(
@@ -332,8 +420,15 @@ class BackwardCompatibilityTest:
                     True, 
                     f"前端未启动或网络问题: {str(e)}"
                 )
+        
+        # 各路由并发探测，前端无响应时整组只等待一个超时周期
+        async with httpx.AsyncClient(base_url=frontend_url, timeout=10) as client:
+            await asyncio.gather(*(
+                _probe(client, route, description)
+                for route, description in routes_to_test
+            ))
     
-    def test_environment_variables_compatibility(self):
+    async def test_environment_variables_compatibility(self):
         """测试环境变量兼容性"""
         print("\n🔧 测试环境变量兼容性...")
         
@@ -347,10 +442,12 @@ class BackwardCompatibilityTest:
                 'ALGORITHM'
             ]
             
-            missing_configs = []
-            for config in critical_configs:
-                if not hasattr(settings, config.lower()) and not hasattr(settings, config):
-                    missing_configs.append(config)
+            # 配置项均为pydantic字段：直接取字段名集合，避免每个配置项两次hasattr
+            attrs = type(settings).model_fields.keys()
+            missing_configs = [
+                config for config in critical_configs
+                if config not in attrs and config.lower() not in attrs
+            ]
             
             if not missing_configs:
                 self.log_test(
@@ -368,31 +465,28 @@ class BackwardCompatibilityTest:
         except Exception as e:
             self.log_test("环境变量兼容性", False, f"配置加载失败: {str(e)}")
     
-    def run_all_tests(self):
+    async def run_all_tests(self):
         """运行所有向后兼容性测试"""
         print("🔄 开始向后兼容性测试...")
         print("=" * 60)
         
-        test_methods = [
-            self.test_existing_upload_endpoints,
-            self.test_email_upload_compatibility,
-            self.test_admin_endpoints_compatibility,
-            self.test_database_schema_compatibility,
-            self.test_api_documentation_compatibility,
-            self.test_frontend_routes_compatibility,
-            self.test_environment_variables_compatibility
-        ]
+        test_methods = [getattr(self, name) for name in COMPATIBILITY_CHECKS]
         
-        for test_method in test_methods:
-            try:
-                test_method()
-            except Exception as e:
+        # 各测试方法互不依赖，并发执行使网络等待相互重叠
+        results = await asyncio.gather(
+            *(test_method() for test_method in test_methods),
+            return_exceptions=True
+        )
+        for test_method, result in zip(test_methods, results):
+            if isinstance(result, Exception):
                 self.log_test(
                     f"{test_method.__name__}执行异常", 
                     False, 
-                    str(e)
+                    str(result)
                 )
         
+        await self.aclient.aclose()
+        
         return self.generate_compatibility_report()
     
     def generate_compatibility_report(self):
@@ -401,8 +495,8 @@ class BackwardCompatibilityTest:
         print("📊 向后兼容性测试报告")
         print("=" * 60)
         
-        total_tests = len(self.test_results)
-        passed_tests = sum(1 for result in self.test_results if result['success'])
+        total_tests = len(self.successes)
+        passed_tests = sum(self.successes)
         failed_tests = total_tests - passed_tests
         
         print(f"总测试数: {total_tests}")
@@ -412,9 +506,9 @@ class BackwardCompatibilityTest:
         
         if failed_tests > 0:
             print("\n❌ 兼容性问题:")
-            for result in self.test_results:
-                if not result['success']:
-                    print(f"  - {result['test_name']}: {result['message']}")
+            for name, success, message in zip(self.names, self.successes, self.messages):
+                if not success:
+                    print(f"  - {name}: {message}")
         
         # 兼容性评估
         compatibility_score = (passed_tests / total_tests * 100) if total_tests > 0 else 0
@@ -431,17 +525,20 @@ class BackwardCompatibilityTest:
         
         # 保存详细报告
         report_file = f"compatibility_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        with open(report_file, 'w', encoding='utf-8') as f:
-            json.dump({
-                "summary": {
-                    "total": total_tests,
-                    "passed": passed_tests,
-                    "failed": failed_tests,
-                    "compatibility_score": compatibility_score
-                },
-                "detailed_results": self.test_results,
-                "recommendations": self.generate_recommendations()
-            }, f, indent=2, ensure_ascii=False)
+        report = {
+            "summary": {
+                "total": total_tests,
+                "passed": passed_tests,
+                "failed": failed_tests,
+                "compatibility_score": compatibility_score
+            },
+            "detailed_results": self.to_dict_list(),
+            "recommendations": self.generate_recommendations()
+        }
+        # orjson直接序列化为UTF-8字节（datetime原生支持），一次写入文件
+        Path(report_file).write_bytes(
+            orjson.dumps(report, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+        )
         
         print(f"\n📄 详细报告已保存到: {report_file}")
         
@@ -455,26 +552,51 @@ class BackwardCompatibilityTest:
     
     def generate_recommendations(self):
         """生成改进建议"""
-        recommendations = []
-        
-        failed_tests = [result for result in self.test_results if not result['success']]
-        
-        if any("端点" in test['test_name'] for test in failed_tests):
-            recommendations.append("检查API端点配置和路由设置")
-        
-        if any("数据库" in test['test_name'] for test in failed_tests):
-            recommendations.append("验证数据库迁移是否正确执行")
-        
-        if any("模型" in test['test_name'] for test in failed_tests):
-            recommendations.append("检查数据模型定义和字段映射")
-        
-        if any("前端" in test['test_name'] for test in failed_tests):
-            recommendations.append("确保前端服务正常运行并检查路由配置")
+        failed_names = [name for name, success in zip(self.names, self.successes) if not success]
         
-        if any("配置" in test['test_name'] for test in failed_tests):
-            recommendations.append("检查环境变量和配置文件设置")
+        # 一次遍历失败的测试，记录命中的关键词；全部命中后提前结束
+        matched = set()
+        for name in failed_names:
+            matched.update(_RECOMMENDATION_RE.findall(name))
+            if len(matched) == len(_RECOMMENDATION_RULES):
+                break
         
-        return recommendations
+        # 按规则顺序输出建议
+        return [
+            recommendation for keyword, recommendation in _RECOMMENDATION_RULES
+            if keyword in matched
+        ]
+
+@pytest.fixture(scope="session")
+def compat_server():
+    """兼容性检查需要运行中的后端服务；无法连接时跳过"""
+    try:
+        httpx.get(f"{BackwardCompatibilityTest().base_url}/openapi.json", timeout=2)
+    except httpx.HTTPError:
+        pytest.skip("后端服务未启动，跳过向后兼容性检查")
+
+
+@pytest.fixture
+async def compat_tester(compat_server):
+    """每个用例使用独立的测试器，结束时关闭其HTTP客户端"""
+    tester = BackwardCompatibilityTest()
+    yield tester
+    await tester.aclient.aclose()
+
+
+@pytest.mark.integration
+@pytest.mark.parametrize("check", COMPATIBILITY_CHECKS)
+async def test_compatibility_check(compat_tester, check):
+    """以pytest用例运行单项兼容性检查，可配合 pytest -n auto 分发到多个worker"""
+    await getattr(compat_tester, check)()
+    
+    failures = [
+        f"{name}: {message}"
+        for name, success, message in zip(compat_tester.names, compat_tester.successes, compat_tester.messages)
+        if not success
+    ]
+    assert not failures, failures
+
 
 def main():
     """主函数"""
@@ -482,7 +604,7 @@ def main():
     print("此工具将验证跟踪系统不会破坏现有功能")
     
     tester = BackwardCompatibilityTest()
-    result = tester.run_all_tests()
+    result = asyncio.run(tester.run_all_tests())
     
     if result['success']:
         print("\n🎉 向后兼容性测试通过！系统保持良好兼容性。")
@@ -5,13 +5,14 @@
 
 import pytest
 import asyncio
+import os
 from unittest.mock import Mock, patch, AsyncMock
 from pathlib import Path
 import tempfile
 import shutil
-from typing import Dict, Any
+from typing import Dict, Any, Mapping
 
-from app.templates.email_templates import EmailTemplateManager, EmailTemplateError
+from app.templates.email_templates import EmailTemplateManager, EmailTemplateError, SegmentTemplate
 
 
 class TestEmailTemplateManager:
@@ -117,7 +118,8 @@ class TestEmailTemplateManager:
         manager = template_manager
         templates = manager.get_available_templates()
         
-        assert isinstance(templates, dict)
+        assert isinstance(templates, Mapping)
+        assert manager.get_available_templates() is templates
         assert 'tracker_confirmation' in templates
         assert 'upload_success' in templates
         assert 'upload_failed' in templates
@@ -158,6 +160,21 @@ class TestEmailTemplateManager:
         assert 'system_name' in content
         assert 'tracker_id' in content
     
+    @pytest.mark.asyncio
+    async def test_load_template_file_cached(self, temp_template_dir):
+        """测试模板文件内容缓存"""
+        manager = EmailTemplateManager()
+        manager.template_dir = Path(temp_template_dir)
+
+        content1 = await manager._load_template_file('tracker_confirmation.html')
+
+        # 删除文件后仍应从缓存中返回内容
+        Path(temp_template_dir, 'tracker_confirmation.html').unlink()
+        content2 = await manager._load_template_file('tracker_confirmation.html')
+
+        assert content1 == content2
+        assert 'tracker_confirmation.html' in manager._source_cache
+
     @pytest.mark.asyncio
     async def test_load_template_file_not_found(self, template_manager):
         """测试加载不存在的模板文件"""
@@ -172,7 +189,7 @@ class TestEmailTemplateManager:
         """测试主题模板渲染"""
         manager = template_manager
         
-        subject_template = "文件上传确认 - Tracker ID: {{ tracker_id }}"
+        subject_template = "文件上传确认 - Tracker ID: {tracker_id}"
         result = manager._render_subject_template(subject_template, sample_template_data)
         
         assert result == "文件上传确认 - Tracker ID: TEST123"
@@ -182,7 +199,7 @@ class TestEmailTemplateManager:
         manager = template_manager
         
         # 使用无效的模板语法
-        subject_template = "文件上传确认 - {{ invalid_syntax"
+        subject_template = "文件上传确认 - {invalid_syntax"
         
         with pytest.raises(EmailTemplateError) as exc_info:
             manager._render_subject_template(subject_template, {})
@@ -270,6 +287,28 @@ class TestEmailTemplateManager:
         # 验证缓存被清除
         assert len(manager._template_cache) == 0
     
+    @pytest.mark.asyncio
+    async def test_auto_reload_recompiles_changed_template(self, temp_template_dir):
+        """测试自动重载只在模板文件修改时间变化后重新编译"""
+        manager = EmailTemplateManager()
+        manager.template_dir = Path(temp_template_dir)
+        manager._auto_reload = True
+        
+        kwargs = dict(tracker_id='TEST123', filename='test.pdf', file_size=1024, recipient_email='test@example.com')
+        await manager.get_tracker_confirmation_email(**kwargs)
+        
+        # 修改时间未变化时不重新读取文件
+        with patch.object(Path, 'read_text', side_effect=AssertionError("不应读取文件")):
+            await manager.get_tracker_confirmation_email(**kwargs)
+        
+        html_path = Path(temp_template_dir, 'tracker_confirmation.html')
+        html_path.write_text('<p>新模板 {{ tracker_id }}</p>', encoding='utf-8')
+        mtime = manager._source_mtimes['tracker_confirmation.html'] + 10
+        os.utime(html_path, (mtime, mtime))
+        
+        result = await manager.get_tracker_confirmation_email(**kwargs)
+        assert result['html_body'] == '<p>新模板 TEST123</p>'
+    
     @pytest.mark.asyncio
     async def test_validate_template_syntax_valid(self, temp_template_dir):
         """测试验证有效的模板语法"""
@@ -318,6 +357,50 @@ class TestEmailTemplateManager:
             assert f'TEST{i}' in result['subject']
             assert f'test{i}.pdf' in result['html_body']
     
+    @pytest.mark.asyncio
+    async def test_render_path_does_not_gather(self, temp_template_dir):
+        """测试渲染路径顺序渲染，不创建并发任务"""
+        manager = EmailTemplateManager()
+        manager.template_dir = Path(temp_template_dir)
+        await manager.initialize()
+        
+        with patch('asyncio.gather', side_effect=AssertionError("渲染路径不应使用gather")):
+            result = await manager.get_upload_status_email(
+                tracker_id='TEST123',
+                status='completed',
+                filename='test.pdf',
+                recipient_email='test@example.com'
+            )
+        
+        assert 'TEST123' in result['html_body']
+        assert 'TEST123' in result['text_body']
+    
+    @pytest.mark.asyncio
+    async def test_render_many(self, temp_template_dir):
+        """测试批量渲染同一模板"""
+        manager = EmailTemplateManager()
+        manager.template_dir = Path(temp_template_dir)
+        
+        rows = [
+            {'tracker_id': f'TEST{i}', 'filename': f'test{i}.pdf', 'file_size': '1.0 KB'}
+            for i in range(3)
+        ]
+        results = await manager.render_many('tracker_confirmation', rows)
+        
+        assert len(results) == 3
+        for i, result in enumerate(results):
+            assert f'TEST{i}' in result['subject']
+            assert f'test{i}.pdf' in result['html_body']
+            assert manager._system_name in result['text_body']
+    
+    @pytest.mark.asyncio
+    async def test_render_many_unknown_template(self, template_manager):
+        """测试批量渲染不存在的模板"""
+        with pytest.raises(EmailTemplateError) as exc_info:
+            await template_manager.render_many('nonexistent_template', [{}])
+        
+        assert "模板不存在" in str(exc_info.value)
+    
     @pytest.mark.asyncio
     async def test_template_error_handling(self, template_manager):
         """测试模板错误处理"""
@@ -358,6 +441,78 @@ class TestEmailTemplateManager:
         await manager.initialize()
         
         assert manager._initialized is True
+    
+    @pytest.mark.asyncio
+    async def test_initialize_concurrent_runs_once(self, temp_template_dir):
+        """测试并发初始化只执行一次"""
+        manager = EmailTemplateManager()
+        manager.template_dir = Path(temp_template_dir)
+        
+        with patch.object(manager, '_compile_templates', wraps=manager._compile_templates) as compile_mock:
+            await asyncio.gather(*(manager.initialize() for _ in range(5)))
+        
+        assert compile_mock.call_count == 1
+        assert manager._initialized is True
+    
+    @pytest.mark.asyncio
+    async def test_initialize_precompiles_templates(self, template_manager):
+        """测试初始化时预编译所有模板"""
+        manager = template_manager
+        
+        await manager.initialize()
+        
+        for config in manager.templates.values():
+            assert config['_html_compiled'].name == config['html_template']
+            assert config['_text_compiled'].name == config['text_template']
+    
+    @pytest.mark.asyncio
+    async def test_segment_templates_match_jinja2(self, template_manager):
+        """测试纯占位符模板走拼接路径，且输出与Jinja2渲染一致"""
+        manager = template_manager
+        variables = {
+            'tracker_id': 'T<1>&"',
+            'filename': "a'b.pdf",
+            'file_size': '1.0 KB',
+            'recipient_email': 'test@example.com',
+            'upload_time': '2024-01-01 12:00:00',
+            'update_time': '2024-01-01 12:00:00',
+            'query_url': 'http://localhost:3000/tracker/T?a=1&b=2',
+            'support_email': 'support@example.com',
+            'system_name': '知识库上传系统',
+            'status': '处理失败',
+            'error_message': '<b>错误</b>'
+        }
+        
+        for filename in ('tracker_confirmation.html', 'tracker_confirmation.txt',
+                         'upload_success.html', 'upload_success.txt'):
+            source = (manager.template_dir / filename).read_text(encoding='utf-8')
+            compiled = manager._compile_template_source(filename, source)
+            assert isinstance(compiled, SegmentTemplate)
+            
+            expected = await manager._get_jinja_env(filename).from_string(source).render_async(**variables)
+            assert compiled.render(variables) == expected
+        
+        # 含{% if %}语句的模板仍由Jinja2编译
+        source = (manager.template_dir / 'upload_failed.html').read_text(encoding='utf-8')
+        assert not isinstance(manager._compile_template_source('upload_failed.html', source), SegmentTemplate)
+    
+    @pytest.mark.asyncio
+    async def test_render_without_file_io_after_initialize(self, temp_template_dir):
+        """测试初始化后渲染不再读取模板文件"""
+        manager = EmailTemplateManager()
+        manager.template_dir = Path(temp_template_dir)
+        
+        await manager.initialize()
+        
+        with patch.object(Path, 'read_text', side_effect=AssertionError("不应读取文件")):
+            result = await manager.get_tracker_confirmation_email(
+                tracker_id='TEST123',
+                filename='test.pdf',
+                file_size=1024,
+                recipient_email='test@example.com'
+            )
+        
+        assert 'TEST123' in result['html_body']
 
 
 class TestEmailTemplateManagerIntegration:
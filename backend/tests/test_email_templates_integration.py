@@ -343,7 +343,7 @@ class TestEmailTemplateErrorHandling:
         manager = EmailTemplateManager()
         
         # 模拟异步操作超时
-        with patch('asyncio.gather', side_effect=asyncio.TimeoutError("操作超时")):
+        with patch('asyncio.to_thread', side_effect=asyncio.TimeoutError("操作超时")):
             with pytest.raises(asyncio.TimeoutError):
                 await manager.get_tracker_confirmation_email(
                     tracker_id='TIMEOUT_TEST',
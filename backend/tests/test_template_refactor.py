@@ -5,9 +5,14 @@
 """
 
 import asyncio
+import functools
+import io
 import sys
 import os
+import re
+from contextvars import ContextVar
 from datetime import datetime
+from typing import Dict, Optional
 
 # 添加项目根目录到Python路径
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -16,102 +21,149 @@ from app.templates.email_templates import email_template_manager
 from app.core.config import settings
 
 
+# 当前测试的输出缓冲区；每个测试（并发运行时即每个任务）各自一份
+_output_buffer: ContextVar[Optional[io.StringIO]] = ContextVar('_output_buffer', default=None)
+
+
+def _print(*args, **kwargs) -> None:
+    """写入当前测试的输出缓冲区；不在缓冲测试中时直接输出"""
+    print(*args, file=_output_buffer.get() or sys.stdout, **kwargs)
+
+
+def buffered_output(test_func):
+    """把测试输出先写入内存，结束时一次性写到stdout，并发运行时各测试的输出也不会交错"""
+    @functools.wraps(test_func)
+    async def wrapper(*args, **kwargs):
+        buffer = io.StringIO()
+        token = _output_buffer.set(buffer)
+        try:
+            return await test_func(*args, **kwargs)
+        finally:
+            _output_buffer.reset(token)
+            sys.stdout.write(buffer.getvalue())
+    return wrapper
+
+
+# 渲染测试与内容验证测试共用的示例邮件参数
+SAMPLE_EMAIL_ARGS = {
+    'tracker_id': "TEST_REFACTOR_001",
+    'filename': "test_refactor.pdf",
+    'file_size': 1024 * 1024,  # 1MB
+    'recipient_email': "test@example.com"
+}
+
+# 已渲染的确认邮件（按参数缓存渲染任务，并发运行的测试共享同一次渲染）
+_rendered_emails: Dict[tuple, asyncio.Task] = {}
+
+
+async def render_confirmation_email(**kwargs) -> Dict[str, str]:
+    """渲染Tracker确认邮件，相同参数只渲染一次"""
+    key = tuple(sorted(kwargs.items()))
+    task = _rendered_emails.get(key)
+    if task is None:
+        task = asyncio.ensure_future(email_template_manager.get_tracker_confirmation_email(**kwargs))
+        _rendered_emails[key] = task
+    return await asyncio.shield(task)
+
+
+@buffered_output
 async def test_template_file_loading():
     """测试模板文件加载"""
-    print("=== 测试模板文件加载 ===")
+    _print("=== 测试模板文件加载 ===")
     
     try:
         # 测试获取可用模板
         available_templates = email_template_manager.get_available_templates()
-        print(f"✅ 可用模板数量: {len(available_templates)}")
+        _print(f"✅ 可用模板数量: {len(available_templates)}")
         
         for name, config in available_templates.items():
-            print(f"  - {name}: {config['html_file']}, {config['text_file']}")
+            _print(f"  - {name}: {config['html_file']}, {config['text_file']}")
         
         return True
         
     except Exception as e:
-        print(f"❌ 模板文件加载失败: {e}")
+        _print(f"❌ 模板文件加载失败: {e}")
         return False
 
 
+@buffered_output
 async def test_template_rendering():
     """测试模板渲染"""
-    print("\n=== 测试模板渲染 ===")
+    _print("\n=== 测试模板渲染 ===")
     
     try:
         # 测试Tracker确认邮件
-        email_content = email_template_manager.get_tracker_confirmation_email(
-            tracker_id="TEST_REFACTOR_001",
-            filename="test_refactor.pdf",
-            file_size=2048 * 1024,  # 2MB
-            recipient_email="test@example.com"
-        )
+        email_content = await render_confirmation_email(**SAMPLE_EMAIL_ARGS)
         
-        print("✅ Tracker确认邮件渲染成功")
-        print(f"主题: {email_content['subject']}")
-        print(f"HTML内容长度: {len(email_content['html_body'])} 字符")
-        print(f"文本内容长度: {len(email_content['text_body'])} 字符")
+        _print("✅ Tracker确认邮件渲染成功")
+        _print(f"主题: {email_content['subject']}")
+        _print(f"HTML内容长度: {len(email_content['html_body'])} 字符")
+        _print(f"文本内容长度: {len(email_content['text_body'])} 字符")
         
         # 验证模板变量是否被正确替换
         if "TEST_REFACTOR_001" in email_content['html_body']:
-            print("✅ HTML模板变量替换正确")
+            _print("✅ HTML模板变量替换正确")
         else:
-            print("❌ HTML模板变量替换失败")
+            _print("❌ HTML模板变量替换失败")
             return False
         
         if "TEST_REFACTOR_001" in email_content['text_body']:
-            print("✅ 文本模板变量替换正确")
+            _print("✅ 文本模板变量替换正确")
         else:
-            print("❌ 文本模板变量替换失败")
+            _print("❌ 文本模板变量替换失败")
             return False
         
         # 测试状态更新邮件
-        status_email = email_template_manager.get_upload_status_email(
+        status_email = await email_template_manager.get_upload_status_email(
             tracker_id="TEST_REFACTOR_001",
             status="completed",
             filename="test_refactor.pdf",
             recipient_email="test@example.com"
         )
         
-        print("✅ 状态更新邮件渲染成功")
-        print(f"主题: {status_email['subject']}")
+        _print("✅ 状态更新邮件渲染成功")
+        _print(f"主题: {status_email['subject']}")
         
         return True
         
     except Exception as e:
-        print(f"❌ 模板渲染失败: {e}")
+        _print(f"❌ 模板渲染失败: {e}")
         return False
 
 
+@buffered_output
 async def test_template_reload():
     """测试模板重新加载"""
-    print("\n=== 测试模板重新加载 ===")
+    _print("\n=== 测试模板重新加载 ===")
     
     try:
-        email_template_manager.reload_templates()
-        print("✅ 模板重新加载成功")
+        await email_template_manager.reload_templates()
+        _print("✅ 模板重新加载成功")
         return True
         
     except Exception as e:
-        print(f"❌ 模板重新加载失败: {e}")
+        _print(f"❌ 模板重新加载失败: {e}")
         return False
 
 
+@buffered_output
 async def test_file_system_integration():
     """测试文件系统集成"""
-    print("\n=== 测试文件系统集成 ===")
+    _print("\n=== 测试文件系统集成 ===")
     
     try:
         # 检查模板目录
         template_dir = email_template_manager.template_dir
-        print(f"模板目录: {template_dir}")
+        _print(f"模板目录: {template_dir}")
         
-        if template_dir.exists():
-            print("✅ 模板目录存在")
-        else:
-            print("❌ 模板目录不存在")
+        # 一次目录扫描取得全部文件名，再与需要的模板文件做集合差
+        try:
+            with os.scandir(template_dir) as entries:
+                present = {entry.name for entry in entries}
+        except FileNotFoundError:
+            _print("❌ 模板目录不存在")
             return False
+        _print("✅ 模板目录存在")
         
         # 检查模板文件
         template_files = [
@@ -123,87 +175,90 @@ async def test_file_system_integration():
             'upload_failed.txt'
         ]
         
-        missing_files = []
+        missing_files = [filename for filename in template_files if filename not in present]
         for filename in template_files:
-            file_path = template_dir / filename
-            if file_path.exists():
-                print(f"✅ {filename} 存在")
+            if filename in missing_files:
+                _print(f"❌ {filename} 不存在")
             else:
-                print(f"❌ {filename} 不存在")
-                missing_files.append(filename)
+                _print(f"✅ {filename} 存在")
         
         if missing_files:
-            print(f"❌ 缺失模板文件: {missing_files}")
+            _print(f"❌ 缺失模板文件: {missing_files}")
             return False
         
         return True
         
     except Exception as e:
-        print(f"❌ 文件系统集成测试失败: {e}")
+        _print(f"❌ 文件系统集成测试失败: {e}")
         return False
 
 
+def _compile_alternation(elements: list) -> "re.Pattern":
+    """把需要查找的字符串编译为一个正则（长的在前，避免被较短的前缀抢先匹配）"""
+    alternatives = sorted({element for element in elements if element}, key=len, reverse=True)
+    return re.compile("|".join(map(re.escape, alternatives)))
+
+
+def _find_missing_elements(pattern: "re.Pattern", elements: list, body: str) -> list:
+    """一次扫描找出正文中缺失的元素"""
+    found = set(pattern.findall(body))
+    # 未被扫描命中的元素再逐个确认：相互重叠的元素可能被相邻的匹配吞掉
+    return [element for element in elements if element not in found and element not in body]
+
+
+@buffered_output
 async def test_template_content_validation():
     """测试模板内容验证"""
-    print("\n=== 测试模板内容验证 ===")
+    _print("\n=== 测试模板内容验证 ===")
     
     try:
-        # 生成测试邮件
-        email_content = email_template_manager.get_tracker_confirmation_email(
-            tracker_id="VALIDATION_TEST_001",
-            filename="validation_test.docx",
-            file_size=1024 * 1024,  # 1MB
-            recipient_email="validation@example.com"
-        )
+        # 复用渲染测试已生成的邮件
+        email_content = await render_confirmation_email(**SAMPLE_EMAIL_ARGS)
         
-        # 验证HTML内容
-        html_body = email_content['html_body']
         required_elements = [
-            'VALIDATION_TEST_001',
-            'validation_test.docx',
+            SAMPLE_EMAIL_ARGS['tracker_id'],
+            SAMPLE_EMAIL_ARGS['filename'],
             '1.0 MB',
-            'validation@example.com',
+            SAMPLE_EMAIL_ARGS['recipient_email'],
             settings.SYSTEM_NAME,
             settings.SUPPORT_EMAIL
         ]
+        # 所有元素合并为一个正则，每个正文只扫描一遍
+        pattern = _compile_alternation(required_elements)
         
-        missing_elements = []
-        for element in required_elements:
-            if element not in html_body:
-                missing_elements.append(element)
-        
-        if missing_elements:
-            print(f"❌ HTML模板缺失元素: {missing_elements}")
-            return False
-        else:
-            print("✅ HTML模板内容验证通过")
-        
-        # 验证文本内容
-        text_body = email_content['text_body']
-        for element in required_elements:
-            if element not in text_body:
-                missing_elements.append(element)
-        
-        if missing_elements:
-            print(f"❌ 文本模板缺失元素: {missing_elements}")
-            return False
-        else:
-            print("✅ 文本模板内容验证通过")
+        for label, body in (("HTML", email_content['html_body']), ("文本", email_content['text_body'])):
+            missing_elements = _find_missing_elements(pattern, required_elements, body)
+            if missing_elements:
+                _print(f"❌ {label}模板缺失元素: {missing_elements}")
+                return False
+            _print(f"✅ {label}模板内容验证通过")
         
         return True
         
     except Exception as e:
-        print(f"❌ 模板内容验证失败: {e}")
+        _print(f"❌ 模板内容验证失败: {e}")
         return False
 
 
+# 脚本模式下同时运行的测试数上限
+MAX_CONCURRENT_TESTS = 8
+
+
+async def _run_test(semaphore: asyncio.BoundedSemaphore, test_name: str, test_func) -> tuple:
+    """在并发上限内运行单个测试，异常记为失败"""
+    async with semaphore:
+        try:
+            return test_name, await test_func()
+        except Exception as e:
+            print(f"❌ {test_name} 测试异常: {e}")
+            return test_name, False
+
+
 async def main():
     """主测试函数"""
     print("开始测试邮件模板重构...")
     print("=" * 60)
     
-    test_results = []
-    
     # 运行所有测试
     tests = [
         ("模板文件加载", test_template_file_loading),
@@ -213,13 +268,11 @@ async def main():
         ("模板内容验证", test_template_content_validation)
     ]
     
-    for test_name, test_func in tests:
-        try:
-            result = await test_func()
-            test_results.append((test_name, result))
-        except Exception as e:
-            print(f"❌ {test_name} 测试异常: {e}")
-            test_results.append((test_name, False))
+    # 各测试相互独立，并发运行；gather按tests的顺序返回结果
+    semaphore = asyncio.BoundedSemaphore(MAX_CONCURRENT_TESTS)
+    test_results = await asyncio.gather(
+        *(_run_test(semaphore, test_name, test_func) for test_name, test_func in tests)
+    )
     
     # 输出测试结果汇总
     print("\n" + "=" * 60)